@@ -0,0 +1,929 @@
+"""
+Offline benchmarks for the scraping and ingest pipeline, and for the API under load.
+Run from app/: python bench.py <benchmark>
+The health benchmark needs DATABASE_URL pointing at an ingested database. roster and stream only need it set, they build their own databases in a temp dir.
+"""
+import argparse
+import asyncio
+import gc
+import html
+import json
+import multiprocessing
+import resource
+import socket
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from fetcher import PageFetcher
+
+DATA_DIR = Path("../data") if Path("../data").exists() else Path("data")
+
+PAGE_DELAY = 0.2 #Simulated server think time per page
+PAGE_COUNT = 24 #Same number of pages as a full six season scrape
+
+
+class SlowPageHandler(BaseHTTPRequestHandler):
+    """Local stand-in for Basketball Reference that takes PAGE_DELAY to answer each page"""
+
+    def do_GET(self):
+        time.sleep(PAGE_DELAY)
+        body = f"<html><body><table><tr><td>{self.path}</td></tr></table></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): #Keep the benchmark output readable
+        pass
+
+
+def start_stand_in_server(handler=SlowPageHandler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def time_fetch(base_url: str, concurrency: int) -> float:
+    urls = {f"page_{i}": f"{base_url}/page_{i}.html" for i in range(PAGE_COUNT)}
+    t0 = time.perf_counter()
+    async with PageFetcher(concurrency=concurrency, min_interval=0) as fetcher:
+        async for name, response, error in fetcher.fetch_all(urls):
+            if error is not None:
+                raise error
+    return time.perf_counter() - t0
+
+
+def bench_fetch():
+    server, base_url = start_stand_in_server()
+    try:
+        print(f"Fetching {PAGE_COUNT} pages, {PAGE_DELAY*1000:.0f} ms each")
+        for concurrency in (1, 2, 4, 8):
+            elapsed = asyncio.run(time_fetch(base_url, concurrency))
+            print(f"  concurrency={concurrency}: {elapsed*1000:8.2f} ms")
+    finally:
+        server.shutdown()
+
+
+def bref_like_page(csv_path: Path, table_id: str, commented: bool, filler_links: int = 2000) -> str:
+    """Rebuilds a Basketball Reference shaped page (over_header row, th row labels, tfoot, filler markup) from a bundled CSV"""
+    import pandas as pd
+
+    header = [0, 1] if csv_path.name.startswith("shooting") else 0
+    df = pd.read_csv(csv_path, header=header).iloc[:-1] #Last row is League Average, it goes in tfoot
+
+    def cell(tag, value, colspan=1):
+        text = "" if pd.isna(value) or str(value).startswith("Unnamed:") else html.escape(str(value))
+        span = f' colspan="{colspan}"' if colspan > 1 else ""
+        return f"<{tag}{span}>{text}</{tag}>"
+
+    head = []
+    if header == [0, 1]:
+        groups = []
+        for top, _ in df.columns:
+            if groups and groups[-1][0] == top and not top.startswith("Unnamed:"):
+                groups[-1][1] += 1
+            else:
+                groups.append([top, 1])
+        head.append('<tr class="over_header">' + "".join(cell("th", top, span) for top, span in groups) + "</tr>")
+        labels = [bottom for _, bottom in df.columns]
+    else:
+        labels = list(df.columns)
+    head.append("<tr>" + "".join(cell("th", label) for label in labels) + "</tr>")
+
+    body = []
+    for i, row in enumerate(df.itertuples(index=False)):
+        body.append("<tr>" + cell("th", row[0]) + "".join(cell("td", v) for v in row[1:]) + "</tr>")
+        if i % 20 == 19:
+            body.append('<tr class="thead">' + head[-1][4:])
+    foot = "<tr>" + cell("th", None) + cell("td", "League Average") + "".join(cell("td", None) for _ in labels[2:]) + "</tr>"
+
+    table = f'<table id="{table_id}"><thead>{"".join(head)}</thead><tbody>{"".join(body)}</tbody><tfoot>{foot}</tfoot></table>'
+    if commented:
+        table = f'<div class="placeholder"></div>\n<!--\n{table}\n-->'
+    filler = "".join(f'<div class="nav"><a href="/players/{i}.html">link {i}</a></div>' for i in range(filler_links))
+    return f'<html><head><title>{csv_path.stem}</title></head><body>{filler}<div id="all_{table_id}">{table}</div>{filler}</body></html>'
+
+
+def load_pages():
+    """Saved raw pages from the snapshot store, or Basketball Reference shaped pages rebuilt from data/ when there are none"""
+    import snapshots
+    from scraper import STAT_TABLE_IDS
+
+    names = snapshots.list_snapshots()
+    if names:
+        return {name: snapshots.load_snapshot(name) for name in names}
+    pages = {}
+    for csv_path in sorted(DATA_DIR.glob("*.csv")):
+        table = csv_path.stem.rsplit("_", 1)[0]
+        pages[csv_path.stem] = bref_like_page(csv_path, STAT_TABLE_IDS[table], commented=table != "per_game")
+    return pages
+
+
+def _measure(func, args, queue):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - t0
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline))
+
+
+def measure_in_subprocess(func, *args):
+    """Runs func(*args) in a fresh process so peak RSS is not shared between runs, returns (seconds, peak RSS growth in KB)"""
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(func, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _parse_pages(parser_name, pages):
+    from scraper import STAT_TABLE_IDS
+    from table_extractor import parse_bref_table, parse_bref_table_v1
+
+    for name, page in pages.items():
+        if parser_name == "v1":
+            parse_bref_table_v1(page)
+        else:
+            parse_bref_table(page, STAT_TABLE_IDS[name.rsplit("_", 1)[0]])
+
+
+def bench_parse():
+    pages = load_pages()
+    print(f"{len(pages)} pages, {sum(len(p) for p in pages.values()) / 1e6:.1f} MB of HTML")
+    for label, parser_name in (("BeautifulSoup + read_html", "v1"), ("lxml streaming extractor", "v2")):
+        elapsed, peak_kb = measure_in_subprocess(_parse_pages, parser_name, pages)
+        print(f"  {label:26s} {elapsed*1000:9.2f} ms   peak RSS +{peak_kb/1024:7.1f} MB")
+
+
+def _load_csvs(seasons):
+    import pandas as pd
+
+    frames = []
+    for season in seasons: #What process_and_merge_data used to do: four full CSV reads per season
+        frames = [
+            pd.read_csv(DATA_DIR / f"per_game_{season}.csv"),
+            pd.read_csv(DATA_DIR / f"per_100_poss_{season}.csv"),
+            pd.read_csv(DATA_DIR / f"advanced_{season}.csv"),
+            pd.read_csv(DATA_DIR / f"shooting_{season}.csv", header=[0, 1]),
+        ]
+    return frames
+
+
+def _load_store(seasons):
+    import scraper
+    import stat_store
+
+    frames = []
+    for season in seasons:
+        frames = [
+            stat_store.read_table(f"per_game_{season}", columns=list(scraper.PER_GAME_COLUMNS)),
+            stat_store.read_table(f"per_100_poss_{season}", columns=list(scraper.PER_100_POSS_COLUMNS)),
+            stat_store.read_table(f"advanced_{season}", columns=list(scraper.ADVANCED_COLUMNS)),
+            stat_store.read_table(f"shooting_{season}", columns=list(scraper.SHOOTING_COLUMNS)),
+        ]
+    return frames
+
+
+def bench_load(repeat: int = 20):
+    import scraper
+    import stat_store
+
+    stat_store.DATA_DIR = DATA_DIR
+    for name in sorted(p.stem for p in DATA_DIR.glob("*.csv")):
+        stat_store.read_table(name, columns=[]) #Builds any missing Arrow files up front
+    seasons = scraper.SEASONS * repeat
+    print(f"Loading the four stat tables for {len(scraper.SEASONS)} seasons x {repeat}")
+    for label, loader in (("pd.read_csv (all columns)", _load_csvs), ("Arrow mmap (projected)", _load_store)):
+        elapsed, peak_kb = measure_in_subprocess(loader, seasons)
+        frame_mb = sum(sum(df.memory_usage(deep=True).sum() for df in loader([season])) for season in scraper.SEASONS) / 1e6
+        print(f"  {label:26s} {elapsed*1000/repeat:9.2f} ms per pass   frames {frame_mb:6.2f} MB   peak RSS +{peak_kb/1024:7.1f} MB")
+
+
+def _selected_tables():
+    import scraper
+    import stat_store
+
+    stat_store.DATA_DIR = DATA_DIR
+    tables = []
+    for season in scraper.SEASONS:
+        for prefix, columns in (("per_game", scraper.PER_GAME_COLUMNS), ("per_100_poss", scraper.PER_100_POSS_COLUMNS),
+                                ("advanced", scraper.ADVANCED_COLUMNS), ("shooting", scraper.SHOOTING_COLUMNS)):
+            tables.append(stat_store.read_table(f"{prefix}_{season}", columns=list(columns)).rename(columns=columns))
+    return tables
+
+
+def bench_dedup(repeat: int = 5):
+    import warnings
+
+    import scraper
+
+    warnings.simplefilter("ignore", FutureWarning) #groupby().apply on grouping columns, the thing being replaced
+    tables = _selected_tables()
+    print(f"Deduping {len(tables)} tables")
+
+    for label, dedup in (("groupby().apply(pick_group)", scraper.keep_tot_or_first_v1), ("vectorized", scraper.keep_tot_or_first)):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for df in tables:
+                dedup(df)
+        print(f"  {label:28s} {(time.perf_counter() - t0)*1000/repeat:9.2f} ms for all seasons")
+
+
+def bench_merge(repeat: int = 5):
+    import scraper
+    import stat_store
+
+    stat_store.DATA_DIR = DATA_DIR
+    print(f"Merging {len(scraper.SEASONS)} seasons")
+
+    def per_season_loop():
+        for year in scraper.SEASONS:
+            scraper.process_and_merge_data_v1(year)
+
+    for label, run in (("one pass per season", per_season_loop), ("single batched pass", lambda: scraper.process_and_merge_seasons(scraper.SEASONS))):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        print(f"  {label:22s} {(time.perf_counter() - t0)*1000/repeat:9.2f} ms for all seasons")
+
+
+def bench_models(repeat: int = 3):
+    import scraper
+    import stat_store
+
+    stat_store.DATA_DIR = DATA_DIR
+    merged = scraper.process_and_merge_seasons(scraper.SEASONS)
+    print(f"Converting {len(merged)} player-seasons")
+
+    for label, convert in (("iterrows + Player per row", lambda: asyncio.run(scraper.create_player_models_v1(merged))),
+                           ("batched columns + TypeAdapter", lambda: scraper.create_player_models(merged))):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            convert()
+        print(f"  {label:30s} {(time.perf_counter() - t0)*1000/repeat:9.2f} ms for all seasons")
+
+
+HEAVY_QUERY = ( #Scoring rank of every player-season within its year, unindexed correlated subquery: DB bound, small result
+    "SELECT s.player_id, s.year, (SELECT COUNT(*) FROM seasons t WHERE t.year = s.year AND t.points_per_game > s.points_per_game) AS points_rank "
+    "FROM seasons s"
+)
+
+
+def health_bench_app():
+    """/health plus the same heavy query behind the old handler pattern and behind the async session dependency"""
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    import database
+
+    app = FastAPI()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await database.async_engine.dispose()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/heavy/blocking")
+    async def heavy_blocking():
+        db = database.SessionLocal() #What the handlers did before: a sync session inside async def, on the event loop
+        try:
+            return len(db.execute(text(HEAVY_QUERY)).all())
+        finally:
+            db.close()
+
+    @app.get("/heavy/async")
+    async def heavy_async(db: AsyncSession = Depends(database.get_db)):
+        return len((await db.execute(text(HEAVY_QUERY))).all())
+
+    return app
+
+
+def start_app_server(app):
+    """Runs the app under uvicorn on its own thread and event loop, like a single worker"""
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP) #IPPROTO_TCP so asyncio turns on TCP_NODELAY for accepted connections
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def health_under_load(base_url: str, heavy_path: Optional[str], workers: int, duration: float):
+    """Probes /health every 10 ms while `workers` clients hit heavy_path back to back"""
+    import httpx
+
+    stop = time.perf_counter() + duration
+    heavy_done = 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def hammer():
+            nonlocal heavy_done
+            while time.perf_counter() < stop:
+                (await client.get(heavy_path)).raise_for_status()
+                heavy_done += 1
+
+        async def probe():
+            latencies = []
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                (await client.get("/health")).raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+                await asyncio.sleep(0.01)
+            return latencies
+
+        tasks = [asyncio.create_task(hammer()) for _ in range(workers if heavy_path else 0)]
+        latencies = await probe()
+        await asyncio.gather(*tasks)
+    return latencies, heavy_done
+
+
+def bench_health(workers: int = 4, duration: float = 5.0):
+    server, thread, base_url = start_app_server(health_bench_app())
+    try:
+        print(f"/health latency while {workers} clients run the heavy player query for {duration:.0f}s")
+        for label, path in (("idle", None), ("sync session (old handlers)", "/heavy/blocking"), ("async session dependency", "/heavy/async")):
+            latencies, heavy_done = asyncio.run(health_under_load(base_url, path, workers, duration))
+            ms = sorted(t * 1000 for t in latencies)
+            p95 = statistics.quantiles(ms, n=20, method="inclusive")[-1]
+            print(f"  {label:28s} p50 {statistics.median(ms):8.2f} ms  p95 {p95:8.2f} ms  max {ms[-1]:8.2f} ms  ({heavy_done} heavy queries)")
+    finally:
+        server.should_exit = True
+        thread.join() #Runs the app's shutdown, which closes the async pool
+
+
+def _roster_database(rows, scale: int):
+    """Temp SQLite database with `scale` copies of the ingested player-seasons, every copy under its own player names"""
+    import tempfile
+
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    import database
+
+    engine = create_engine(f"sqlite:///{Path(tempfile.mkdtemp()) / f'roster_x{scale}.db'}")
+    database.Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        for copy in range(scale):
+            database.upsert_players(db, [dict(r, player_name=f"{r['player_name']} {copy}" if copy else r["player_name"]) for r in rows])
+        #The old one-row-per-season layout, for the old handler
+        db.execute(text("CREATE TABLE players_wide AS SELECT p.player_name, p.birth_year, p.headshot_url, s.* FROM seasons s JOIN players p ON p.id = s.player_id"))
+        db.commit()
+    return engine
+
+
+def _roster_old(db):
+    """What /players/names used to do: load every season row, dedup with any() over the growing list"""
+    from sqlalchemy import text
+
+    unique_players = []
+    for r in db.execute(text("SELECT * FROM players_wide")).all():
+        if not any(existing["player_name"] == r.player_name and existing["birth_year"] == r.birth_year for existing in unique_players):
+            unique_players.append({"player_name": r.player_name, "birth_year": r.birth_year})
+    return unique_players
+
+
+def bench_roster(repeat: int = 20):
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    import database
+    import scraper
+    import stat_store
+
+    stat_store.DATA_DIR = DATA_DIR
+    rows = scraper.create_player_models(scraper.process_and_merge_seasons(scraper.SEASONS))
+    variants = {
+        "all players, by name": {},
+        "all players, -birth_year": {"sort": "-birth_year"},
+        "season 2025": {"season": 2025},
+        "season 2025, position PG": {"season": 2025, "position": "PG"},
+    }
+    for scale in (1, 10):
+        engine = _roster_database(rows, scale)
+        with Session(engine) as db:
+            seasons = db.execute(text("SELECT COUNT(*) FROM seasons")).scalar()
+            t0 = time.perf_counter()
+            old = _roster_old(db)
+            old_ms = (time.perf_counter() - t0) * 1000
+            new = db.execute(database.roster_query()).mappings().all()
+            assert {(p["player_name"], p["birth_year"]) for p in old} == {(p["player_name"], p["birth_year"]) for p in new}
+            print(f"  x{scale}: {seasons} player-seasons, {len(new)} players, parity ok")
+            print(f"    {'full rows + any() dedup':28s} {old_ms:9.2f} ms")
+            for label, params in variants.items():
+                t0 = time.perf_counter()
+                for _ in range(repeat):
+                    count = len(db.execute(database.roster_query(**params)).all())
+                print(f"    {label:28s} {(time.perf_counter() - t0)*1000/repeat:9.2f} ms ({count} players)")
+        engine.dispose()
+
+
+def _list_all_seasons(db_url: str) -> int:
+    """What GET /players used to do: every season as an ORM object, validated into List[Player], one JSON body"""
+    from typing import List
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import Session
+
+    import database
+    from models import Player
+
+    adapter = TypeAdapter(List[Player])
+    with Session(create_engine(db_url)) as db:
+        rows = db.execute(select(database.Season)).scalars().all()
+        return len(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)))
+
+
+def _stream_all_seasons(db_url: str) -> int:
+    """GET /players?format=ndjson: batches off a cursor, encoded and dropped one at a time"""
+    import json
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    import database
+
+    async def consume():
+        engine = create_async_engine(database.async_database_url(db_url))
+        size = 0
+        async for batch in database.stream_rows(database.seasons_page_query(), async_sessionmaker(engine)):
+            size += len("".join(json.dumps(row) + "\n" for row in batch))
+        await engine.dispose()
+        return size
+
+    return asyncio.run(consume())
+
+
+def bench_stream():
+    import scraper
+    import stat_store
+
+    stat_store.DATA_DIR = DATA_DIR
+    rows = scraper.create_player_models(scraper.process_and_merge_seasons(scraper.SEASONS))
+    engines = {scale: _roster_database(rows, scale) for scale in (1, 10)}
+    del rows
+    print("GET /players, whole table")
+    for scale, engine in engines.items():
+        db_url = engine.url.render_as_string(hide_password=False)
+        engine.dispose()
+        for label, run in (("List[Player] response", _list_all_seasons), ("ndjson off a cursor", _stream_all_seasons)):
+            elapsed, peak_kb = measure_in_subprocess(run, db_url)
+            print(f"  x{scale:<3d} {label:22s} {elapsed*1000:9.2f} ms  peak RSS +{peak_kb/1024:7.1f} MB")
+
+
+DEV_ONLY = {"fakeredis"} #Benchmarks needing these are skipped when they aren't installed
+CACHE_CLIENTS = 50 #Concurrent report requests
+CACHE_READS = 20 #Cache hits per request
+REPORT_BYTES = 4096 #About one scouting report
+
+
+def start_fake_redis():
+    """fakeredis speaking the Redis protocol on a local port, so every command pays a real socket round-trip"""
+    from fakeredis import TcpFakeServer
+
+    class NoDelayFakeServer(TcpFakeServer):
+        request_queue_size = 128 #socketserver's default backlog of 5 drops a burst of new connections
+
+        def get_request(self): #Real Redis sets TCP_NODELAY, without it the handshake replies sit in Nagle's buffer
+            conn, addr = super().get_request()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return conn, addr
+
+    server = NoDelayFakeServer(("127.0.0.1", 0))
+    server.daemon_threads = True #TcpFakeServer turns this off, connections a client never closed would keep the process alive
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.001) -> list:
+    """How late a 1 ms sleep wakes up, sampled until stop is set: time the loop spent blocked"""
+    lags = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t0 - interval)
+    return lags
+
+
+async def _cache_load(read) -> tuple:
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_loop_lag(stop))
+    await asyncio.sleep(0.01)
+
+    async def request(i):
+        for _ in range(CACHE_READS):
+            assert await read(f"bench:report:{i % 10}") is not None
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(CACHE_CLIENTS)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    return elapsed, await monitor
+
+
+def bench_cache():
+    import redis
+
+    import cache
+
+    server, url = start_fake_redis()
+    sync_client = redis.from_url(url)
+    for i in range(10):
+        sync_client.set(f"bench:report:{i}", cache.encode("x" * REPORT_BYTES, time.time()))
+
+    async def sync_get(key): #The old handlers: redis.from_url client called inside async def
+        return cache.decode(sync_client.get(key))[0]
+
+    async def run_async():
+        try:
+            return await _cache_load(cache.get)
+        finally:
+            await cache.close()
+
+    cache.REDIS_URL = url
+    cache.LOCAL_MAX_ENTRIES = 0 #Every read goes to Redis, this compares clients not tiers
+    print(f"{CACHE_CLIENTS} concurrent requests x {CACHE_READS} cache hits of {REPORT_BYTES} bytes, fakeredis over TCP")
+    for label, run in (("sync redis client", lambda: asyncio.run(_cache_load(sync_get))), ("redis.asyncio pool", lambda: asyncio.run(run_async()))):
+        elapsed, lags = run()
+        ms = sorted(t * 1000 for t in lags)
+        print(f"  {label:20s} {elapsed*1000:8.1f} ms total   loop lag p50 {statistics.median(ms):6.2f} ms  p95 {statistics.quantiles(ms, n=20, method='inclusive')[-1]:6.2f} ms  max {ms[-1]:7.2f} ms")
+    server.shutdown()
+
+    async def outage():
+        cache.REDIS_URL = "redis://127.0.0.1:1/0" #Nothing listens on port 1
+        t0 = time.perf_counter()
+        value = await cache.get("bench:report:0")
+        elapsed = time.perf_counter() - t0
+        await cache.close()
+        return value, elapsed
+
+    value, elapsed = asyncio.run(outage())
+    assert value is None
+    print(f"  Redis down: get() -> miss in {elapsed*1000:.1f} ms, no exception")
+
+
+COALESCE_WORKERS = 4 #Processes, like uvicorn --workers
+COALESCE_REQUESTS = 25 #Concurrent requests for the same report in each worker
+GENERATION_SECONDS = 0.5 #Stand-in for a Gemini call
+
+
+def _coalesce_worker(url: str, key: str, crash: bool, lock_ttl_ms: int, queue):
+    """One worker process: COALESCE_REQUESTS concurrent get_or_generate calls for the same key, reports their sources"""
+    import os
+
+    import cache
+
+    cache.REDIS_URL = url
+    cache.LOCK_TTL_MS = lock_ttl_ms
+    cache.LOCK_POLL_INTERVAL = 0.05
+
+    async def generate():
+        await cache.get_client().incr(f"{key}:generations") #Counted in Redis so every process adds to the same total
+        if crash:
+            os._exit(1) #Dies holding the lock, without releasing it
+        await asyncio.sleep(GENERATION_SECONDS)
+        return "x" * REPORT_BYTES
+
+    async def run():
+        try:
+            results = await asyncio.gather(*(cache.get_or_generate(key, generate) for _ in range(COALESCE_REQUESTS)))
+            return [source for _, source in results]
+        finally:
+            await cache.close()
+
+    queue.put(asyncio.run(run()))
+
+
+def _coalesce_run(url: str, key: str, lock_ttl_ms: int, crash_first: bool) -> tuple:
+    """Returns (generations, sources of every request, seconds until the last worker finished)"""
+    import redis
+
+    client = redis.from_url(url)
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    t0 = time.perf_counter()
+    procs = []
+    if crash_first: #Make sure the crashing worker is the one holding the lock
+        procs.append(ctx.Process(target=_coalesce_worker, args=(url, key, True, lock_ttl_ms, queue)))
+        procs[0].start()
+        while not client.exists(f"lock:{key}"):
+            time.sleep(0.005)
+    for _ in range(COALESCE_WORKERS):
+        procs.append(ctx.Process(target=_coalesce_worker, args=(url, key, False, lock_ttl_ms, queue)))
+        procs[-1].start()
+    sources = []
+    for _ in range(COALESCE_WORKERS):
+        sources += queue.get()
+    elapsed = time.perf_counter() - t0
+    for proc in procs:
+        proc.join()
+    generations = int(client.get(f"{key}:generations") or 0)
+    client.close()
+    return generations, sources, elapsed
+
+
+def bench_coalesce():
+    import cache
+
+    server, url = start_fake_redis()
+    total = COALESCE_WORKERS * COALESCE_REQUESTS
+    print(f"{COALESCE_WORKERS} workers x {COALESCE_REQUESTS} concurrent requests for one uncached report, {GENERATION_SECONDS*1000:.0f} ms generation")
+
+    generations, sources, elapsed = _coalesce_run(url, "bench:coalesce", cache.LOCK_TTL_MS, crash_first=False)
+    counts = {source: sources.count(source) for source in ("generated", "coalesced", "cache")}
+    print(f"  {total} requests -> {generations} generation in {elapsed*1000:.0f} ms  ({counts})")
+
+    lock_ttl_ms = 1000
+    generations, sources, elapsed = _coalesce_run(url, "bench:coalesce-crash", lock_ttl_ms, crash_first=True)
+    print(f"  Lock holder crashed: lock expired after {lock_ttl_ms} ms, {generations - 1} worker took over, {len(sources)} requests served in {elapsed*1000:.0f} ms")
+    server.shutdown()
+
+
+LLM_CONCURRENT = 50 #Reports generating at once on one worker
+LLM_CHUNKS = 10 #Streamed chunks per report
+LLM_CHUNK_DELAY = 0.1 #Stub model think time per chunk
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Answers the Gemini REST API (generateContent, streamGenerateContent?alt=sse) after LLM_CHUNK_DELAY per chunk"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunks = [{"candidates": [{"content": {"role": "model", "parts": [{"text": f"chunk {i} "}]}}]} for i in range(LLM_CHUNKS)]
+        if "streamGenerateContent" not in self.path:
+            time.sleep(LLM_CHUNK_DELAY * LLM_CHUNKS)
+            text = "".join(c["candidates"][0]["content"]["parts"][0]["text"] for c in chunks)
+            body = json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                time.sleep(self.server.stall or LLM_CHUNK_DELAY)
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.dropped += 1 #Client closed the stream, the model would stop generating
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_gemini():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler, bind_and_activate=False)
+    server.request_queue_size = 128 #Default backlog of 5 would queue most of the concurrent requests
+    server.server_bind()
+    server.server_activate()
+    server.daemon_threads = True
+    server.stall, server.dropped = 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_llm():
+    import os
+
+    import llm
+    from scheduler import scheduler
+
+    scheduler.max_in_flight = 0 #Measures the client, bench.py scheduler measures the queue
+    server, url = start_stub_gemini()
+    os.environ["GOOGLE_GEMINI_BASE_URL"] = url
+    os.environ["GEMINI_API_KEY"] = "stub"
+    report_seconds = LLM_CHUNK_DELAY * LLM_CHUNKS
+    print(f"{LLM_CONCURRENT} concurrent reports on one event loop, stub model takes {report_seconds*1000:.0f} ms per report")
+
+    def on_new_loop(coro_fn):
+        llm.use("gemini") #New client: client.aio's connections belong to the loop that opened them
+        return asyncio.run(coro_fn())
+
+    async def blocking_stream(player_data): #The old generator: sync SDK stream iterated inside async def
+        provider = llm.get_provider()
+        for chunk in provider.client().models.generate_content_stream(model=provider.model, contents=llm.build_prompt(player_data)):
+            yield chunk.text
+
+    async def consume(stream):
+        return "".join([token async for token in stream])
+
+    for label, make in (
+        ("sync stream in async def", lambda d: consume(blocking_stream(d))),
+        ("client.aio stream", lambda d: consume(llm.generate_report_stream(d))),
+        ("client.aio generate", llm.generate_report),
+    ):
+        async def run():
+            stop = asyncio.Event()
+            monitor = asyncio.create_task(_loop_lag(stop))
+            t0 = time.perf_counter()
+            reports = await asyncio.gather(*(make({"player_name": f"p{i}", "stats": ""}) for i in range(LLM_CONCURRENT)))
+            elapsed = time.perf_counter() - t0
+            stop.set()
+            assert all(r.startswith("chunk 0") for r in reports)
+            return elapsed, await monitor
+
+        elapsed, lags = on_new_loop(run)
+        print(f"  {label:26s} {elapsed*1000:8.0f} ms total   loop lag max {max(lags)*1000:7.1f} ms")
+
+    async def cancelled():
+        consumer = asyncio.create_task(consume(llm.generate_report_stream({"player_name": "p", "stats": ""})))
+        await asyncio.sleep(LLM_CHUNK_DELAY * 2.5) #Mid-stream, like a websocket closing halfway through a report
+        t0 = time.perf_counter()
+        consumer.cancel() #What until_disconnect does when the client goes away
+        try:
+            await consumer
+        except asyncio.CancelledError:
+            stopped = time.perf_counter() - t0
+        else:
+            raise AssertionError("the stream should have been cancelled")
+        gc.collect() #The SDK's abandoned response sits in a reference cycle, released on the next collection
+        await asyncio.sleep(LLM_CHUNK_DELAY * 2) #Stub notices on its next write
+        return stopped
+
+    dropped = server.dropped
+    stopped = on_new_loop(cancelled)
+    assert server.dropped == dropped + 1, "the HTTP stream should be closed"
+    print(f"  Cancelled mid-stream: generation stopped {stopped*1000:.1f} ms after the disconnect, stub saw the stream close")
+
+    async def stalled():
+        llm.LLM_CHUNK_TIMEOUT = 0.3
+        t0 = time.perf_counter()
+        try:
+            await consume(llm.generate_report_stream({"player_name": "p", "stats": ""}))
+        except asyncio.TimeoutError:
+            return time.perf_counter() - t0
+        raise AssertionError("a stalled stream should time out")
+
+    server.stall = 5
+    print(f"  Stub stalls: TimeoutError after {on_new_loop(stalled)*1000:.0f} ms (LLM_CHUNK_TIMEOUT=0.3)")
+    server.shutdown()
+    llm.LLM_CHUNK_TIMEOUT = 30
+
+    #The same load on the local stub provider, no HTTP at all
+    stub = llm.use("stub", tokens=LLM_CHUNKS * 5, chunk_tokens=5, ttft=LLM_CHUNK_DELAY, tokens_per_second=5 / LLM_CHUNK_DELAY)
+
+    async def stub_run():
+        first_tokens = []
+
+        async def timed(player_data):
+            t0 = time.perf_counter()
+            tokens = []
+            async for token in llm.generate_report_stream(player_data):
+                if not tokens:
+                    first_tokens.append(time.perf_counter() - t0)
+                tokens.append(token)
+            return "".join(tokens)
+
+        t0 = time.perf_counter()
+        reports = await asyncio.gather(*(timed({"player_name": "p", "stats": f"row {i % 5}"}) for i in range(LLM_CONCURRENT)))
+        elapsed = time.perf_counter() - t0
+        assert reports[0] == reports[5] != reports[1], "stub reports depend only on the prompt"
+        assert reports[0] == await stub.generate(llm.build_prompt({"player_name": "p", "stats": "row 0"}))
+        return elapsed, statistics.median(first_tokens)
+
+    elapsed, ttft = asyncio.run(stub_run())
+    print(f"  {'stub provider stream':26s} {elapsed*1000:8.0f} ms total   ttft p50 {ttft*1000:.0f} ms   deterministic per prompt")
+
+
+SCHEDULER_MAX_IN_FLIGHT = 8
+SCHEDULER_BACKGROUND = 120 #Warm-up flood queued at once
+SCHEDULER_INTERACTIVE = 20 #User requests arriving while it drains
+SCHEDULER_WORKERS = 4
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[int(p * (len(values) - 1))]
+
+
+def bench_scheduler():
+    import cache
+    import llm
+    from scheduler import Scheduler
+
+    server, url = start_fake_redis()
+    cache.REDIS_URL = url
+    provider = llm.use("stub", tokens=40, chunk_tokens=10, ttft=0.05, tokens_per_second=400) #About 150 ms per report
+    generate = provider.generate
+    active = peak = 0
+
+    async def counted(prompt):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            return await generate(prompt)
+        finally:
+            active -= 1
+
+    provider.generate = counted
+    print(
+        f"{SCHEDULER_BACKGROUND} background reports queued at once, then {SCHEDULER_INTERACTIVE} interactive ones every 100 ms, "
+        f"stub model, at most {SCHEDULER_MAX_IN_FLIGHT} in flight"
+    )
+
+    def run(schedulers, background_priority, interactive_priority, tokens=0):
+        nonlocal peak
+        peak = 0
+
+        async def request(i, priority, delay):
+            await asyncio.sleep(delay)
+            t0 = time.perf_counter()
+            async with schedulers[i % len(schedulers)].slot(priority, tokens):
+                admitted = time.time()
+                waited = time.perf_counter() - t0
+                await provider.generate(f"prompt {i}")
+            return priority, waited, admitted
+
+        async def main():
+            try:
+                t0 = time.perf_counter()
+                results = await asyncio.gather(
+                    *(request(i, background_priority, 0) for i in range(SCHEDULER_BACKGROUND)),
+                    *(request(i, interactive_priority, 0.1 * (i + 1)) for i in range(SCHEDULER_INTERACTIVE)),
+                )
+                return results, time.perf_counter() - t0
+            finally:
+                await cache.close()
+
+        results, elapsed = asyncio.run(main())
+        interactive = [waited for _, waited, _ in results[SCHEDULER_BACKGROUND:]]
+        background = [waited for _, waited, _ in results[:SCHEDULER_BACKGROUND]]
+        return interactive, background, elapsed, [admitted for _, _, admitted in results]
+
+    def show(label, interactive, background, elapsed):
+        print(
+            f"  {label:34s} interactive wait p50 {statistics.median(interactive)*1000:6.0f} ms  p95 {_percentile(interactive, 0.95)*1000:6.0f} ms"
+            f"   background p50 {statistics.median(background)*1000:6.0f} ms   total {elapsed:5.1f} s   peak in flight {peak}"
+        )
+
+    fifo = run([Scheduler(SCHEDULER_MAX_IN_FLIGHT, 0, 0, shared=False)], "interactive", "interactive") #One class: arrival order
+    show("one worker, no priorities", *fifo[:3])
+    prioritised = run([Scheduler(SCHEDULER_MAX_IN_FLIGHT, 0, 0, shared=False)], "background", "interactive")
+    show("one worker, interactive first", *prioritised[:3])
+    workers = [Scheduler(SCHEDULER_MAX_IN_FLIGHT, 0, 0, shared=True, namespace="bench") for _ in range(SCHEDULER_WORKERS)]
+    shared = run(workers, "background", "interactive")
+    show(f"{SCHEDULER_WORKERS} workers sharing Redis", *shared[:3])
+
+    #Per-minute budgets, with 1 s periods so the run stays short: 20 requests and 15 x 1000 tokens per period across workers
+    rpm, tpm, tokens = 20, 15000, 1000
+    workers = [Scheduler(0, rpm, tpm, shared=True, namespace="bench-budget", window=1.0) for _ in range(SCHEDULER_WORKERS)]
+    interactive, background, elapsed, admitted = run(workers, "background", "interactive", tokens)
+    per_period = {}
+    for t in admitted:
+        per_period[int(t)] = per_period.get(int(t), 0) + 1
+    show(f"{SCHEDULER_WORKERS} workers, rpm/tpm budgets", interactive, background, elapsed)
+    print(f"  Most requests admitted in one 1 s period: {max(per_period.values())} (budget {min(rpm, tpm // tokens)})")
+    server.shutdown()
+
+
+BENCHMARKS = {
+    "fetch": bench_fetch,
+    "parse": bench_parse,
+    "load": bench_load,
+    "dedup": bench_dedup,
+    "merge": bench_merge,
+    "models": bench_models,
+    "health": bench_health,
+    "roster": bench_roster,
+    "stream": bench_stream,
+    "cache": bench_cache,
+    "coalesce": bench_coalesce,
+    "llm": bench_llm,
+    "scheduler": bench_scheduler,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS) + ["all"])
+    args = parser.parse_args()
+    for name, bench in BENCHMARKS.items():
+        if args.benchmark in (name, "all"):
+            print(f"\n== {name} ==")
+            try:
+                bench()
+            except ModuleNotFoundError as e:
+                if e.name not in DEV_ONLY:
+                    raise
+                print(f"  skipped: needs {e.name}, pip install -r requirements-dev.txt from the repo root")
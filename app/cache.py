@@ -0,0 +1,403 @@
+"""
+Report cache on Redis, through redis.asyncio so a round-trip never blocks the event loop.
+Redis is an optimization here, not a dependency: any Redis error is logged and treated as a miss
+(reads) or a skipped write, so an outage makes reports slower instead of failing them.
+
+Values are zlib-compressed in Redis. Reports are keyed by content (content_key): a hash of everything
+that went into them, so new stats mean a new key and entries can live for a long time.
+Stale-while-revalidate: past REPORT_SOFT_TTL (or when only the previous report for an alias exists) lookup()
+still returns the value, marked stale, and revalidate() regenerates it once in the background.
+Past REPORT_TTL Redis has dropped it and it's a plain miss.
+
+Hits are served from a small in-process LRU tier first (bounded by entries and bytes, short TTL), then Redis.
+Content keys never change meaning, so nothing has to be invalidated across workers.
+
+get_or_generate coalesces concurrent misses for the same key: one generation per key inside a worker
+(shared future) and across workers (Redis lock, SET NX PX, kept alive while its holder is queued for the LLM
+or generating). Everyone else waits for that result.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from redis.exceptions import RedisError, WatchError
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20")) #Per worker, requests past this wait for a free connection
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "1")) #Seconds to wait for a free connection before giving up (-> miss)
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5")) #Per command, a stuck Redis costs at most this much
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.5"))
+REPORT_TTL = int(os.getenv("REPORT_TTL", str(30 * 24 * 3600))) #Hard TTL. Keys change with the stats, so this only clears out reports nobody asks for
+REPORT_SOFT_TTL = int(os.getenv("REPORT_SOFT_TTL", str(7 * 24 * 3600))) #Older reports are served stale and regenerated in the background
+COMPRESSION_LEVEL = 6
+LOCAL_MAX_ENTRIES = int(os.getenv("REPORT_LOCAL_MAX_ENTRIES", "256")) #Per worker, least recently used entries go first
+LOCAL_MAX_BYTES = int(os.getenv("REPORT_LOCAL_MAX_BYTES", str(8 * 1024 * 1024)))
+LOCAL_TTL = float(os.getenv("REPORT_LOCAL_TTL", "60")) #Bounds how long a worker keeps an alias pointing at an older report
+LOCK_TTL_MS = int(os.getenv("REPORT_LOCK_TTL_MS", "120000")) #Refreshed while its holder waits and generates, a crashed worker's lock frees itself after this
+LOCK_POLL_INTERVAL = float(os.getenv("REPORT_LOCK_POLL_INTERVAL", "0.2")) #How often other workers check for the result
+
+_inflight: Dict[str, asyncio.Future] = {} #key -> result of the generation running in this worker
+_ABANDONED = object() #Leader was cancelled (client went away), a waiter takes over
+
+
+class GenerationAbandoned(Exception):
+    """Raised by a generate callback whose requester went away, waiters take over instead of failing with it"""
+
+_client: Optional[aioredis.Redis] = None
+
+_local: "OrderedDict[str, Tuple[str, float, float, int]]" = OrderedDict() #key -> (value, created, expires at, size in bytes), oldest first
+_local_bytes = 0
+_stats = {
+    "local": {"hits": 0, "misses": 0},
+    "redis": {"hits": 0, "misses": 0, "errors": 0},
+    "revalidate": {"stale_served": 0, "started": 0},
+}
+_revalidating: Dict[str, asyncio.Task] = {} #key -> background regeneration, one per key per worker
+
+
+def get_client() -> aioredis.Redis:
+    """Worker-wide client, the pool is created on first use inside the running event loop"""
+    global _client
+    if _client is None:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=30,
+        )
+        _client = aioredis.Redis.from_pool(pool) #Client owns the pool, aclose() disconnects it
+    return _client
+
+
+def content_key(namespace: str, payload) -> str:
+    """namespace:sha256 of payload as canonical JSON, the same payload always maps to the same key"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{namespace}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def encode(value: str, created: float) -> bytes:
+    """Compressed {"value", "created"} envelope, created (epoch seconds) is what the soft TTL is measured from"""
+    return zlib.compress(json.dumps({"value": value, "created": created}).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decode(raw: bytes) -> Tuple[str, float]:
+    """(value, created), values written before the envelope existed come back as created=0 (stale)"""
+    text = zlib.decompress(raw).decode("utf-8")
+    try:
+        envelope = json.loads(text)
+        return envelope["value"], float(envelope["created"])
+    except (ValueError, TypeError, KeyError):
+        return text, 0.0
+
+
+def _local_get(key: str) -> Optional[Tuple[str, float]]:
+    entry = _local.get(key)
+    if entry is None:
+        return None
+    value, created, expires_at, _ = entry
+    if expires_at <= time.monotonic():
+        _local_drop(key)
+        return None
+    _local.move_to_end(key) #Most recently used
+    return value, created
+
+
+def _local_put(key: str, value: str, created: float, ttl: float):
+    global _local_bytes
+    size = len(value.encode("utf-8"))
+    _local_drop(key)
+    if size > LOCAL_MAX_BYTES or LOCAL_MAX_ENTRIES <= 0:
+        return
+    _local[key] = (value, created, time.monotonic() + min(ttl, LOCAL_TTL), size)
+    _local_bytes += size
+    while len(_local) > LOCAL_MAX_ENTRIES or _local_bytes > LOCAL_MAX_BYTES:
+        _local_drop(next(iter(_local)))
+
+
+def _local_drop(key: str):
+    global _local_bytes
+    entry = _local.pop(key, None)
+    if entry is not None:
+        _local_bytes -= entry[3]
+
+
+def clear_local():
+    """Empties this worker's tier (Redis is untouched)"""
+    global _local_bytes
+    _local.clear()
+    _local_bytes = 0
+
+
+async def _redis_get(key: str) -> Optional[Tuple[str, float]]:
+    try:
+        value = await get_client().get(key)
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        _stats["redis"]["errors"] += 1
+        print(f"Redis unavailable, treating {key} as a cache miss: {e!r}")
+        return None
+    if value is None:
+        return None
+    try:
+        value, created = decode(value)
+    except zlib.error:
+        print(f"Dropping {key}, not a compressed value")
+        return None
+    _local_put(key, value, created, LOCAL_TTL)
+    return value, created
+
+
+async def _find(key: str) -> Tuple[Optional[Tuple[str, float]], str]:
+    """((value, created) or None, tier that answered: "local", "redis" or "miss"), not counted in stats()"""
+    entry = _local_get(key)
+    if entry is not None:
+        return entry, "local"
+    entry = await _redis_get(key)
+    return entry, "redis" if entry is not None else "miss"
+
+
+def _count(tier: str):
+    """One read in stats(): a local hit, or a local miss plus a Redis hit or miss"""
+    if tier == "local":
+        _stats["local"]["hits"] += 1
+        return
+    _stats["local"]["misses"] += 1
+    _stats["redis"]["hits" if tier == "redis" else "misses"] += 1
+
+
+async def _get_entry(key: str) -> Optional[Tuple[str, float]]:
+    """(value, created) from the local tier, then Redis, counted in stats()"""
+    entry, tier = await _find(key)
+    _count(tier)
+    return entry
+
+
+async def get(key: str) -> Optional[str]:
+    entry = await _get_entry(key)
+    return entry[0] if entry is not None else None
+
+
+async def set(key: str, value: str, ttl: int = REPORT_TTL, created: Optional[float] = None) -> bool:
+    created = time.time() if created is None else created
+    _local_put(key, value, created, ttl)
+    try:
+        await get_client().setex(key, ttl, encode(value, created))
+        return True
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        print(f"Redis unavailable, not caching {key}: {e!r}")
+        return False
+
+
+def stats() -> dict:
+    """Hit/miss counters per tier since the worker started, plus the local tier's size and stale-while-revalidate counts"""
+    return {
+        "local": {**_stats["local"], "entries": len(_local), "bytes": _local_bytes},
+        "redis": dict(_stats["redis"]),
+        "revalidate": {**_stats["revalidate"], "running": len(_revalidating)},
+    }
+
+
+async def close():
+    """Stops background work and releases the pool, called on shutdown (and between event loops in scripts)"""
+    global _client
+    for task in list(_revalidating.values()): #Unfinished background regenerations, the stale value stays cached
+        task.cancel()
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+
+
+async def _acquire(lock_key: str, token: str) -> bool:
+    try:
+        return bool(await get_client().set(lock_key, token, nx=True, px=LOCK_TTL_MS))
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        print(f"Redis unavailable, generating {lock_key} without a lock: {e!r}")
+        return True #No coordination without Redis, still serve the request
+
+
+async def _release(lock_key: str, token: str):
+    """Deletes the lock only if it is still ours (it may have expired and been taken over)"""
+    try:
+        async with get_client().pipeline(transaction=True) as pipe:
+            await pipe.watch(lock_key)
+            if await pipe.get(lock_key) == token.encode():
+                pipe.multi()
+                pipe.delete(lock_key)
+                await pipe.execute()
+            else:
+                await pipe.unwatch()
+    except WatchError:
+        pass #Changed hands between GET and DEL, not ours any more
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        print(f"Redis unavailable, {lock_key} will expire on its own: {e!r}")
+
+
+async def _refresh(lock_key: str, token: str) -> bool:
+    """Pushes the lock's expiry back if it is still ours, False once it isn't"""
+    async with get_client().pipeline(transaction=True) as pipe:
+        await pipe.watch(lock_key)
+        if await pipe.get(lock_key) != token.encode():
+            await pipe.unwatch()
+            return False
+        pipe.multi()
+        pipe.pexpire(lock_key, LOCK_TTL_MS)
+        await pipe.execute()
+        return True
+
+
+async def _keep_lock(lock_key: str, token: str, done: asyncio.Event):
+    """
+    Refreshes the lock every third of its TTL until done is set. Generation can outlast the TTL (queued behind the
+    LLM scheduler's budgets, then LLM_TIMEOUT), the TTL only has to cover a worker that crashes while holding it.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(done.wait(), LOCK_TTL_MS / 3000)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            if not await _refresh(lock_key, token):
+                print(f"Lost {lock_key} while generating, another worker may generate it too")
+                return
+        except WatchError:
+            pass #Released or taken over meanwhile, the next round tells which
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            print(f"Redis unavailable, could not refresh {lock_key}: {e!r}")
+
+
+async def _stop_keeping(keeper: asyncio.Task, done: asyncio.Event, lock_key: str, token: str):
+    done.set()
+    await keeper #Ends at once, or after the refresh it is in the middle of
+    await _release(lock_key, token)
+
+
+async def _wait_for_other_worker(key: str, lock_key: str, fresher_than: float) -> Optional[str]:
+    """Polls for the value another worker is generating, None once its lock is gone without a value"""
+    while True:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await _redis_get(key)
+        if entry is not None and entry[1] >= fresher_than:
+            return entry[0]
+        try:
+            if not await get_client().exists(lock_key): #Finished without caching, failed, or crashed and expired
+                return None
+        except (RedisError, OSError, asyncio.TimeoutError):
+            return None
+
+
+async def _generate_once(key: str, generate: Callable[[], Awaitable[str]], ttl: int, alias: Optional[str], fresher_than: float) -> Tuple[str, bool]:
+    """Cross-worker half: whoever holds the Redis lock generates, the rest pick up its cached value"""
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    while True:
+        if await _acquire(lock_key, token):
+            done = asyncio.Event()
+            keeper = asyncio.get_running_loop().create_task(_keep_lock(lock_key, token, done))
+            try:
+                entry = await _redis_get(key) #Another worker may have finished between our miss and the lock
+                if entry is not None and entry[1] >= fresher_than:
+                    return entry[0], False
+                value = await generate()
+                await set(key, value, ttl)
+                if alias is not None:
+                    await set(alias, key, ttl) #Latest key for the alias, served stale once the key changes
+                return value, True
+            finally:
+                await asyncio.shield(_stop_keeping(keeper, done, lock_key, token)) #Runs to the end even if we are cancelled again meanwhile
+        value = await _wait_for_other_worker(key, lock_key, fresher_than)
+        if value is not None:
+            return value, False
+        #Lock gone and nothing cached: try to take over
+
+
+async def get_or_generate(
+    key: str,
+    generate: Callable[[], Awaitable[str]],
+    ttl: int = REPORT_TTL,
+    alias: Optional[str] = None,
+    fresher_than: float = 0.0,
+) -> Tuple[str, str]:
+    """
+    Returns (value, source), source is "cache", "generated" (this call ran generate) or "coalesced"
+    (another request's generation, in this worker or another one). generate runs at most once per key at a time.
+    Cached values created before fresher_than (epoch seconds) count as missing.
+    Callers lookup() first, so this re-check isn't counted in stats() again.
+    """
+    while True:
+        entry, _ = await _find(key)
+        if entry is not None and entry[1] >= fresher_than:
+            return entry[0], "cache"
+
+        leader = _inflight.get(key)
+        if leader is not None:
+            value = await asyncio.shield(leader) #Our own cancellation must not cancel the leader
+            if value is _ABANDONED:
+                continue
+            return value, "coalesced"
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            value, generated = await _generate_once(key, generate, ttl, alias, fresher_than)
+            future.set_result(value)
+            return value, "generated" if generated else "coalesced"
+        except (asyncio.CancelledError, GenerationAbandoned):
+            future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() #Marks it retrieved when nobody was waiting
+            raise
+        finally:
+            _inflight.pop(key, None)
+
+
+async def lookup(key: str, alias: Optional[str] = None) -> Optional[Tuple[str, bool]]:
+    """
+    (value, fresh) without generating anything, None on a miss. Past REPORT_SOFT_TTL the value comes back with
+    fresh=False. If key is missing, the last value generated for alias (an older key) is returned as stale.
+    """
+    entry, tier = await _find(key)
+    if entry is None and alias is not None:
+        previous, _ = await _find(alias)
+        if previous is not None and previous[0] != key:
+            entry, tier = await _find(previous[0])
+            if entry is not None:
+                entry = (entry[0], 0.0) #Different inputs, stale however recent
+    _count(tier) #Once per lookup, however many keys the alias fallback read
+    if entry is None:
+        return None
+    value, created = entry
+    fresh = time.time() - created < REPORT_SOFT_TTL
+    if not fresh:
+        _stats["revalidate"]["stale_served"] += 1
+    return value, fresh
+
+
+def revalidate(key: str, generate: Callable[[], Awaitable[str]], ttl: int = REPORT_TTL, alias: Optional[str] = None):
+    """Regenerates key in the background after a stale lookup(), at most once at a time per key (single-flight across workers too)"""
+    if key in _revalidating:
+        return
+
+    async def run():
+        try:
+            await get_or_generate(key, generate, ttl, alias, fresher_than=time.time() - REPORT_SOFT_TTL)
+        except Exception as e:
+            print(f"Background regeneration of {key} failed, still serving the stale value: {e!r}")
+        finally:
+            _revalidating.pop(key, None)
+
+    _stats["revalidate"]["started"] += 1
+    _revalidating[key] = asyncio.get_running_loop().create_task(run())
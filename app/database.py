@@ -1,25 +1,82 @@
-from sqlalchemy import create_engine, Column, String, Float, Integer
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, Column, ForeignKey, String, Float, Integer, Index, func, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
 import os
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5")) #Connections kept open per worker
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10")) #Extra connections allowed under burst load
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30")) #Seconds a request waits for a free connection before failing
+
+
+def async_database_url(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://..., sqlite:///... -> sqlite+aiosqlite:///..."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        query = dict(parsed.query)
+        if "sslmode" in query: #libpq spelling, asyncpg calls it ssl
+            query["ssl"] = query.pop("sslmode")
+        return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    raise NotImplementedError(f"No async driver configured for {backend}")
+
+
+#Sync engine: migrations at startup and the batch ingest, which runs in a worker thread
 engine = create_engine(DATABASE_URL)
 Base = declarative_base()
 SessionLocal=sessionmaker(bind=engine)
 
+#Async engine: every request handler, so a slow query waits on the driver instead of blocking the event loop
+async_engine = create_async_engine(
+    os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True, #Hosted Postgres drops idle connections
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency, one session per request, returned to the pool when the response is done"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+PLAYER_KEY = ("player_name", "birth_year") #One row per player
+SEASON_KEY = ("player_id", "year") #One row per player-season
+UPSERT_BATCH_SIZE = 250 #250 rows x ~60 columns stays under SQLite's bound parameter limit
+STREAM_BATCH_SIZE = 500 #Rows fetched per round trip from a server-side cursor
+
 class Player(Base):
     __tablename__ = 'players'
-    
-    id = Column(Integer, primary_key=True, index=True, nullable=False)
-    year = Column(Float, nullable=False)
+    __table_args__ = (
+        Index("uq_players_name_birth_year", *PLAYER_KEY, unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, nullable=False)
     player_name = Column(String, nullable=False)
-    age = Column(Float, nullable=False)
     birth_year = Column(Float, nullable=False)
-    position = Column(String, nullable=False)
     headshot_url = Column(String)
+
+    seasons = relationship("Season", back_populates="player", order_by="Season.year", passive_deletes=True)
+
+
+class Season(Base):
+    __tablename__ = 'seasons'
+
+    #Composite primary key: every "seasons for player X" lookup is a probe on its leftmost column
+    player_id = Column(Integer, ForeignKey("players.id", ondelete="CASCADE"), primary_key=True)
+    year = Column(Float, primary_key=True)
+    age = Column(Float, nullable=False)
+    position = Column(String, nullable=False)
     games_played = Column(Float)
     minutes_played_per_game = Column(Float)
     field_goals_made_per_game = Column(Float)
@@ -83,4 +140,182 @@ class Player(Base):
     # Corner three statistics
     corner_three_attempt_percentage = Column(Float)
     corner_three_made_percentage = Column(Float)
-    
\ No newline at end of file
+
+    player = relationship(Player, back_populates="seasons", lazy="joined") #Identity comes along in the same query
+
+    #Read only views of the player's identity so a Season validates straight into models.Player
+    @property
+    def player_name(self):
+        return self.player.player_name
+
+    @property
+    def birth_year(self):
+        return self.player.birth_year
+
+    @property
+    def headshot_url(self):
+        return self.player.headshot_url
+
+
+def player_id_query(player_name: str, birth_year: float):
+    """Name + birth year -> id, for the routes that still take a name"""
+    return select(Player.id).where(Player.player_name == player_name, Player.birth_year == birth_year)
+
+
+def player_seasons_query(player_id: int):
+    """Every season for one player. Shared by the endpoints and migrations.check_query_plans so the plan check sees the real query"""
+    return select(Season).where(Season.player_id == player_id).order_by(Season.year)
+
+
+def players_seasons_query(player_ids: Sequence[int]):
+    """Every season for several players in one round trip (POST /reports/batch), grouped by player"""
+    return select(Season).where(Season.player_id.in_(player_ids)).order_by(Season.player_id, Season.year)
+
+
+def player_headshot_query(player_id: int):
+    return select(Player.headshot_url).where(Player.id == player_id)
+
+
+ROSTER_SORTS = { #sort parameter -> ORDER BY, name order walks the unique index instead of sorting
+    "name": (Player.player_name, Player.birth_year),
+    "-name": (Player.player_name.desc(), Player.birth_year.desc()),
+    "birth_year": (Player.birth_year, Player.player_name),
+    "-birth_year": (Player.birth_year.desc(), Player.player_name),
+}
+
+
+def roster_query(sort: str = "name", season: Optional[float] = None, position: Optional[str] = None):
+    """
+    One row per player (id, name, birth year) straight from the players table, no season rows loaded.
+    season / position keep only players with a matching season, as an EXISTS probe on the seasons primary key.
+    """
+    stmt = select(Player.id.label("player_id"), Player.player_name, Player.birth_year)
+    if season is not None or position is not None:
+        match = select(Season.player_id).where(Season.player_id == Player.id)
+        if season is not None:
+            match = match.where(Season.year == season)
+        if position is not None:
+            match = match.where(Season.position == position)
+        stmt = stmt.where(match.exists())
+    return stmt.order_by(*ROSTER_SORTS[sort]) #Every order ends on the unique (name, birth year) pair
+
+
+def top_minutes_query(limit: int, season: Optional[float] = None):
+    """Player ids by total minutes (games x minutes per game) in season, the latest season by default"""
+    if season is None:
+        season = select(func.max(Season.year)).scalar_subquery()
+    minutes = func.coalesce(Season.games_played * Season.minutes_played_per_game, 0)
+    return select(Season.player_id).where(Season.year == season).order_by(minutes.desc(), Season.player_id).limit(limit)
+
+
+def season_columns(fields: Optional[Sequence[str]] = None) -> list:
+    """
+    Columns for a player-season listing, player_id and year always first (they are the cursor).
+    Raises ValueError on unknown field names.
+    """
+    season = {c.name: c for c in Season.__table__.columns}
+    identity = {name: Player.__table__.c[name] for name in ("player_name", "birth_year", "headshot_url")}
+    available = {"player_id": season.pop("player_id"), "year": season.pop("year"), **identity, **season}
+    if fields is None:
+        fields = list(available)
+    unknown = sorted(set(fields) - set(available))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    names = ["player_id", "year"] + [f for f in dict.fromkeys(fields) if f not in ("player_id", "year")]
+    return [available[name] for name in names]
+
+
+def seasons_page_query(fields: Optional[Sequence[str]] = None, after: Optional[Tuple[int, float]] = None, limit: Optional[int] = None):
+    """
+    Player-seasons in (player_id, year) order, keyset paginated: `after` is the last (player_id, year) already seen,
+    so every page is a range read on the seasons primary key no matter how deep it is.
+    """
+    columns = season_columns(fields)
+    stmt = select(*columns).select_from(Season)
+    if any(c.table is Player.__table__ for c in columns): #Only join for identity columns that were asked for
+        stmt = stmt.join(Player, Player.id == Season.player_id)
+    if after is not None:
+        stmt = stmt.where(tuple_(Season.player_id, Season.year) > tuple_(*after))
+    stmt = stmt.order_by(Season.player_id, Season.year)
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+async def stream_rows(stmt, session_factory=None, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    """
+    Yields the rows of stmt as lists of dicts, batch_size at a time, off a server-side cursor.
+    Opens its own session: a streaming response outlives the request's get_db session.
+    """
+    async with (session_factory or AsyncSessionLocal)() as session:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        async for batch in result.mappings().partitions():
+            yield [dict(row) for row in batch]
+
+
+def _insert_for(db):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Bulk upsert is not supported on {dialect}")
+
+
+def _upsert(db, insert, table, key, rows: List[dict]) -> list:
+    """One executemany INSERT ... ON CONFLICT DO UPDATE, returns the keys that were inserted or actually changed"""
+    update_columns = [c for c in rows[0] if c not in key]
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={c: stmt.excluded[c] for c in update_columns},
+        where=or_(*(table.c[c].is_distinct_from(stmt.excluded[c]) for c in update_columns)), #Skip rows that didn't change
+    ).returning(*(table.c[k] for k in key))
+    #executemany form: SQLAlchemy compiles the statement once and sends multi-row VALUES batches ("insertmanyvalues")
+    return db.execute(stmt.execution_options(insertmanyvalues_page_size=UPSERT_BATCH_SIZE), rows).tuples().all()
+
+
+def upsert_players(db, rows: List[dict]) -> dict:
+    """
+    Bulk upsert of player-season dicts (Postgres and SQLite), in two steps:
+    players by (player_name, birth_year), then seasons by (player_id, year).
+    Rows whose values changed are updated, identical rows are left alone.
+    Returns season counts {"inserted": n, "updated": n, "unchanged": n}.
+    """
+    insert = _insert_for(db)
+    players, seasons = Player.__table__, Season.__table__
+    player_columns = [c.name for c in players.columns if c.name != "id"] #Straight from the tables, no hand written field list
+    season_columns = [c.name for c in seasons.columns if c.name != "player_id"]
+
+    people, by_key = {}, {}
+    for row in rows: #ON CONFLICT can't touch the same row twice in one statement, last one wins
+        person = tuple(row.get(k) for k in PLAYER_KEY)
+        if row.get("headshot_url") or person not in people:
+            people[person] = {c: row.get(c) for c in player_columns}
+        by_key[person + (row.get("year"),)] = row
+    if not by_key:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    _upsert(db, insert, players, PLAYER_KEY, list(people.values()))
+    names = {person[0] for person in people}
+    ids = {}
+    for player_id, player_name, birth_year in db.execute(
+        select(players.c.id, players.c.player_name, players.c.birth_year).where(players.c.player_name.in_(names))
+    ):
+        ids[(player_name, birth_year)] = player_id
+
+    season_rows = []
+    for (player_name, birth_year, year), row in by_key.items():
+        season_row = {c: row.get(c) for c in season_columns}
+        season_row["player_id"] = ids[(player_name, birth_year)]
+        season_rows.append(season_row)
+
+    years = {row["year"] for row in season_rows}
+    existing = set(db.execute(select(seasons.c.player_id, seasons.c.year).where(seasons.c.year.in_(years))).tuples())
+
+    inserted = updated = 0
+    for key in _upsert(db, insert, seasons, SEASON_KEY, season_rows): #Only inserted and actually updated rows come back
+        if tuple(key) in existing:
+            updated += 1
+        else:
+            inserted += 1
+
+    return {"inserted": inserted, "updated": updated, "unchanged": len(season_rows) - inserted - updated}
@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+RETRY_STATUSES = {429, 500, 502, 503, 504} #Rate limited or server-side hiccups, worth another try
+USER_AGENT = "ai-basketball-scout/1.0 (+https://github.com/anthonyq7/ai-basketball-scout)"
+
+
+class HostRateLimiter:
+    """Spaces out request starts so each host sees at most one request every min_interval seconds"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, host: str):
+        if self.min_interval <= 0:
+            return
+        async with self._lock: #Only reserve the slot under the lock, sleep outside of it
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class PageFetcher:
+    """
+    Shared async HTTP engine for scraping.
+    One pooled AsyncClient (keep-alive), a semaphore bounding requests in flight,
+    a per-host politeness limiter and retry with exponential backoff on 429/5xx.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        min_interval: float = 3.0,
+        max_retries: int = 4,
+        backoff: float = 1.0,
+        timeout: float = 30.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(min_interval)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._client = client
+        self._owns_client = client is None
+
+    async def __aenter__(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+                timeout=self.timeout,
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+            )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after) #Server told us exactly how long to back off
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> httpx.Response:
+        """GET a single url, retrying on retryable statuses and transport errors"""
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            response = None
+            async with self._semaphore:
+                await self.rate_limiter.wait(host)
+                try:
+                    response = await self._client.get(url, headers=headers)
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    if response.status_code == 304: #Conditional request, caller keeps its snapshot
+                        return response
+                    if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                        response.raise_for_status()
+                        return response
+            await asyncio.sleep(self._retry_delay(attempt, response)) #Sleep without holding a slot
+            attempt += 1
+
+    async def fetch_all(self, urls: Dict[str, str], headers: Optional[Dict[str, dict]] = None):
+        """
+        Fetch every url in {name: url} concurrently, with optional per-name request headers.
+        Yields (name, response, error) tuples in completion order.
+        """
+        headers = headers or {}
+
+        async def run(name, url):
+            try:
+                return name, await self.fetch(url, headers=headers.get(name)), None
+            except Exception as e:
+                return name, None, e
+
+        tasks = [asyncio.create_task(run(name, url)) for name, url in urls.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks: #Consumer bailed out early, don't leave requests running
+                task.cancel()
@@ -1,68 +1,43 @@
 import google.genai as genai
+from google.genai import types
 from dotenv import load_dotenv
-import json
-import asyncio
+import httpx
+from typing import AsyncIterator, Optional
 load_dotenv()
 
-client = genai.Client() #Finds GEMINI_API_KEY from .env
+DEFAULT_MODEL = "gemini-2.5-flash"
 
-def generate_report(player_data: dict):
-    prompt = (
-        "You are an analytical, direct, and witty AI basketball assistant with deep knowledge of the game.\n "
-        "Using the provided player statistics across all available seasons, write a concise, data-driven scouting report between 250-600 words.\n"
-        "Maintain a professional and technical tone. Structure the report into the following sections, each separated by line breaks\n"
-        "Overview\n"
-        "Strengths\n"
-        "Weaknesses\n"
-        "Playstyle and Tendencies\n"
-        "Scheme Fit\n"
-        "Guidelines:\n"
-        "Base every statement strictly on the supplied statistics; do not invent or infer information without statistical support.\n"
-        "Keep formatting simple (no bullets, asterisks, or special characters), just text and line breaks.\n"
-        "Be accurate, formal, and consistent in presentation.\n"
-        f"{player_data}"
-    )
 
-    response = client.models.generate_content(
-    model="gemini-2.5-flash",
-    contents=prompt
-    )
+class GeminiProvider:
+    """llm.Provider backed by the Gemini API, through the SDK's async client (client.aio) so the event loop is never blocked"""
+    name = "gemini"
 
-    return response.text
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or DEFAULT_MODEL
+        self._client = None
 
-async def generate_report_stream(player_data: dict):
-    """
-    Generate a streaming report using Google Gen AI.
-    Yields tokens as they are generated.
-    """
-    prompt = (
-        "You are an analytical, direct, and witty AI basketball assistant with deep knowledge of the game.\n "
-        "Using the provided player statistics across all available seasons, write a concise, data-driven scouting report between 250-600 words.\n"
-        "Maintain a professional and technical tone. Structure the report into the following sections, each separated by line breaks\n"
-        "Overview\n"
-        "Strengths\n"
-        "Weaknesses\n"
-        "Playstyle and Tendencies\n"
-        "Scheme Fit\n"
-        "Guidelines:\n"
-        "Base every statement strictly on the supplied statistics; do not invent or infer information without statistical support.\n"
-        "Keep formatting simple (no bullets, asterisks, or special characters), just text and line breaks.\n"
-        "Be accurate, formal, and consistent in presentation.\n"
-        f"{player_data}"
-    )
+    def client(self) -> genai.Client:
+        """Created on first use, so choosing this provider (or importing llm) doesn't need an API key"""
+        if self._client is None:
+            #Finds GEMINI_API_KEY from .env. A transport makes client.aio use one pooled httpx client instead of an aiohttp
+            #session per streamed request, which the SDK never closes when a stream is abandoned (websocket disconnects)
+            self._client = genai.Client(http_options=types.HttpOptions(async_client_args={"transport": httpx.AsyncHTTPTransport()}))
+        return self._client
 
-    try:
-        #Use streaming API from Google Gen AI
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            stream=True  #Enables streaming
-        )
-        
-        #Stream the response token by token
-        for chunk in response:
-            if hasattr(chunk, 'text') and chunk.text:
-                yield chunk.text
-                
-    except Exception as e:
-        yield "Error generating report"
\ No newline at end of file
+    async def generate(self, prompt: str) -> str:
+        response = await self.client().aio.models.generate_content(model=self.model, contents=prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        #Native async streaming: each chunk is awaited, nothing blocks while Gemini is writing
+        chunks = await self.client().aio.models.generate_content_stream(model=self.model, contents=prompt)
+        try:
+            async for chunk in chunks:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            await chunks.aclose()
+
+    async def count_tokens(self, text: str) -> int:
+        response = await self.client().aio.models.count_tokens(model=self.model, contents=text)
+        return response.total_tokens
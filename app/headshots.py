@@ -0,0 +1,121 @@
+"""
+Name -> NBA player id index for headshot URLs.
+Built once from nba_api's static player list, saved to data/headshot_index.json and reused across seasons and runs.
+"""
+import json
+import re
+import unicodedata
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Dict, Optional
+
+from nba_api.stats.static import players as nba_players
+
+INDEX_PATH = Path(__file__).resolve().parent.parent / "data" / "headshot_index.json" #Repo data/, wherever the process starts from
+INDEX_FORMAT = 1
+SUFFIXES = {"jr", "sr", "ii", "iii", "iv", "v"}
+
+
+def nba_cdn_headshot(nba_player_id: int, size="1040x760") -> str:
+    return f"https://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/{size}/{nba_player_id}.png"
+
+
+def normalize_name(name: str, strip_suffix: bool = False) -> str:
+    """ "Nikola Jokić" -> "nikola jokic", "P.J. Tucker" -> "pj tucker", "Tim Hardaway Jr." -> "tim hardaway jr" (or "tim hardaway") """
+    if not name:
+        return ""
+    folded = unicodedata.normalize("NFKD", name)
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch)).casefold() #Folds accents: ć -> c
+    folded = re.sub(r"[.'’`]", "", folded) #P.J. -> pj, De'Andre -> deandre
+    tokens = re.sub(r"[^a-z0-9]+", " ", folded).split() #Hyphens, commas, anything else -> word break
+    if strip_suffix:
+        while len(tokens) > 1 and tokens[-1] in SUFFIXES:
+            tokens.pop()
+    return " ".join(tokens)
+
+
+def _source_version() -> str:
+    try:
+        return version("nba_api")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class HeadshotResolver:
+    def __init__(self, exact: Dict[str, int], loose: Dict[str, int], fallback: Optional[Dict[str, Optional[int]]] = None):
+        self.exact = exact #normalized full name (suffix kept) -> id
+        self.loose = loose #normalized name without Jr./III etc -> id
+        self.fallback = fallback or {} #raw names the index missed -> id from the old regex search (None if that missed too)
+        self._dirty = False
+
+    @classmethod
+    def build(cls) -> "HeadshotResolver":
+        exact, loose = {}, {}
+        #When two players share a normalized name prefer the active one, then the most recent id
+        ranked = sorted(nba_players.get_players(), key=lambda p: (p["is_active"], p["id"]))
+        for player in ranked:
+            exact[normalize_name(player["full_name"])] = player["id"]
+            loose[normalize_name(player["full_name"], strip_suffix=True)] = player["id"]
+        return cls(exact, loose)
+
+    @classmethod
+    def load(cls, path: Path = INDEX_PATH) -> "HeadshotResolver":
+        """Loads the saved index, rebuilding it when missing or built from a different nba_api release"""
+        if path.exists():
+            try:
+                saved = json.loads(path.read_text())
+                if saved.get("format") == INDEX_FORMAT and saved.get("source") == _source_version():
+                    return cls(saved["exact"], saved["loose"], saved.get("fallback"))
+            except (ValueError, KeyError):
+                pass #Corrupt index, rebuild below
+        resolver = cls.build()
+        resolver._dirty = True
+        resolver.save(path)
+        return resolver
+
+    def save(self, path: Path = INDEX_PATH):
+        if not self._dirty:
+            return
+        path.parent.mkdir(exist_ok=True)
+        payload = {"format": INDEX_FORMAT, "source": _source_version(), "exact": self.exact, "loose": self.loose, "fallback": self.fallback}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload))
+        tmp.replace(path)
+        self._dirty = False
+
+    def _regex_fallback(self, name: str) -> Optional[int]:
+        """What get_player_headshot used to do, only for names the index misses and only once per name"""
+        if name not in self.fallback:
+            try:
+                matches = nba_players.find_players_by_full_name(re.escape(name))
+            except Exception:
+                matches = []
+            self.fallback[name] = int(matches[0]["id"]) if matches else None
+            self._dirty = True
+        return self.fallback[name]
+
+    def resolve_id(self, player_name: str) -> Optional[int]:
+        name = player_name.strip() if player_name else ""
+        if not name:
+            return None
+        player_id = self.exact.get(normalize_name(name))
+        if player_id is None:
+            player_id = self.loose.get(normalize_name(name, strip_suffix=True))
+        if player_id is None:
+            player_id = self._regex_fallback(name)
+        return player_id
+
+    def resolve(self, player_name: str) -> Optional[str]:
+        player_id = self.resolve_id(player_name)
+        return nba_cdn_headshot(int(player_id)) if player_id is not None else None
+
+
+_resolver: Optional[HeadshotResolver] = None
+
+
+def get_resolver() -> HeadshotResolver:
+    """Process-wide resolver, loaded from disk on first use"""
+    global _resolver
+    if _resolver is None:
+        _resolver = HeadshotResolver.load()
+    return _resolver
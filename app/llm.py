@@ -0,0 +1,169 @@
+"""
+Report generation behind a provider interface: the prompt lives here once, providers only turn a prompt into text.
+LLM_PROVIDER picks the provider (gemini, or stub for offline runs and load tests) and LLM_MODEL its model.
+The stub writes a deterministic report per prompt at LLM_STUB_TTFT seconds to the first token, then
+LLM_STUB_TOKENS_PER_SECOND, so caching, streaming and concurrency can be benchmarked without a network or key.
+Every request waits for a slot from scheduler.py first, whichever the provider.
+"""
+import asyncio
+import hashlib
+import os
+import random
+from typing import AsyncIterator, Optional, Protocol
+
+from dotenv import load_dotenv
+
+from scheduler import request_tokens, scheduler
+
+load_dotenv()
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL") #Unset = the provider's default
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90")) #Seconds for a whole report, streamed or not
+LLM_CHUNK_TIMEOUT = float(os.getenv("LLM_CHUNK_TIMEOUT", "30")) #Longest wait for the first or next streamed chunk
+
+LLM_STUB_TTFT = float(os.getenv("LLM_STUB_TTFT", "0.5"))
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "50"))
+LLM_STUB_TOKENS = int(os.getenv("LLM_STUB_TOKENS", "400")) #Report length, in words
+LLM_STUB_CHUNK_TOKENS = int(os.getenv("LLM_STUB_CHUNK_TOKENS", "20")) #Words per streamed chunk
+
+PROMPT_VERSION = 2 #Bump when PROMPT_TEMPLATE changes, cached reports are keyed on it, the provider and the model
+PROMPT_TEMPLATE = (
+    "You are an analytical, direct, and witty AI basketball assistant with deep knowledge of the game.\n "
+    "Using the provided player statistics across all available seasons, write a concise, data-driven scouting report between 250-600 words.\n"
+    "Maintain a professional and technical tone. Structure the report into the following sections, each separated by line breaks\n"
+    "Overview\n"
+    "Strengths\n"
+    "Weaknesses\n"
+    "Playstyle and Tendencies\n"
+    "Scheme Fit\n"
+    "Guidelines:\n"
+    "Base every statement strictly on the supplied statistics; do not invent or infer information without statistical support.\n"
+    "Keep formatting simple (no bullets, asterisks, or special characters), just text and line breaks.\n"
+    "Be accurate, formal, and consistent in presentation.\n"
+    "Statistics: one row per season, Basketball Reference abbreviations, percentages out of 100, - means not available.\n"
+    "{stats}"
+)
+
+
+def build_prompt(player_data: dict) -> str:
+    return PROMPT_TEMPLATE.format(stats=player_data["stats"])
+
+
+class Provider(Protocol):
+    name: str
+    model: str
+
+    async def generate(self, prompt: str) -> str: ...
+
+    def stream(self, prompt: str) -> AsyncIterator[str]: ... #Async generator, closing it ends the request
+
+    async def count_tokens(self, text: str) -> int: ...
+
+
+class StubProvider:
+    """Deterministic local model: the same prompt always gets the same report, after the configured delays"""
+    name = "stub"
+    SECTIONS = ["Overview", "Strengths", "Weaknesses", "Playstyle and Tendencies", "Scheme Fit"]
+    WORDS = (
+        "efficient volume usage spacing rim pressure playmaking rebounding defense transition perimeter "
+        "shooting touch length motor switchable creation turnover rate foul drawing pick-and-roll "
+        "catch-and-shoot isolation post midrange corner assists steals blocks minutes role starter"
+    ).split()
+
+    def __init__(self, model: Optional[str] = None, ttft: Optional[float] = None, tokens_per_second: Optional[float] = None,
+                 tokens: Optional[int] = None, chunk_tokens: Optional[int] = None):
+        self.model = model or "stub-1"
+        self.ttft = LLM_STUB_TTFT if ttft is None else ttft
+        self.tokens_per_second = tokens_per_second or LLM_STUB_TOKENS_PER_SECOND
+        self.tokens = tokens or LLM_STUB_TOKENS
+        self.chunk_tokens = max(1, chunk_tokens or LLM_STUB_CHUNK_TOKENS)
+
+    def report_tokens(self, prompt: str) -> list:
+        """Words with their trailing space or line break, joined they are the report"""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest()) #Seeded by the prompt, not the process
+        per_section = max(2, self.tokens // len(self.SECTIONS))
+        tokens = []
+        for section in self.SECTIONS:
+            tokens.append(f"{section}\n")
+            for i in range(1, per_section):
+                end = ".\n\n" if i == per_section - 1 else ". " if i % 12 == 0 else " "
+                tokens.append(rng.choice(self.WORDS) + end)
+        return tokens
+
+    async def generate(self, prompt: str) -> str:
+        tokens = self.report_tokens(prompt)
+        await asyncio.sleep(self.ttft + len(tokens) / self.tokens_per_second)
+        return "".join(tokens)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        tokens = self.report_tokens(prompt)
+        await asyncio.sleep(self.ttft)
+        for start in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[start:start + self.chunk_tokens]
+            if start:
+                await asyncio.sleep(len(chunk) / self.tokens_per_second)
+            yield "".join(chunk)
+
+    async def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+
+def _gemini(model: Optional[str] = None) -> Provider:
+    from gemini import GeminiProvider #google-genai is only needed when Gemini is actually used
+
+    return GeminiProvider(model)
+
+
+PROVIDERS = {"gemini": _gemini, "stub": StubProvider}
+
+_provider: Optional[Provider] = None
+
+
+def use(name: str, model: Optional[str] = None, **settings) -> Provider:
+    """Switches this process to another provider (warmup.py --stub, benchmarks), settings go to its constructor"""
+    global _provider
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider {name!r}, pick from {', '.join(PROVIDERS)}")
+    _provider = PROVIDERS[name](model, **settings)
+    return _provider
+
+
+def get_provider() -> Provider:
+    """The configured provider, created on first use"""
+    return _provider or use(LLM_PROVIDER, LLM_MODEL)
+
+
+async def generate_report(player_data: dict, priority: str = "interactive") -> str:
+    """
+    Whole report in one response, once the scheduler has a slot for it (priority: interactive, batch or background).
+    Raises scheduler.SchedulerBusy if none frees up in time, asyncio.TimeoutError past LLM_TIMEOUT
+    """
+    prompt = build_prompt(player_data)
+    async with scheduler.slot(priority, request_tokens(prompt)):
+        return await asyncio.wait_for(get_provider().generate(prompt), LLM_TIMEOUT)
+
+
+async def generate_report_stream(player_data: dict, priority: str = "interactive") -> AsyncIterator[str]:
+    """
+    Yields the report as it is generated, holding a scheduler slot until the stream ends. Raises SchedulerBusy like
+    generate_report, asyncio.TimeoutError past LLM_CHUNK_TIMEOUT / LLM_TIMEOUT (counted from the first request to the
+    model, not the queue), and closing or cancelling the generator ends the provider's request.
+    """
+    prompt = build_prompt(player_data)
+    async with scheduler.slot(priority, request_tokens(prompt)):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LLM_TIMEOUT
+        stream = get_provider().stream(prompt)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"Report took longer than {LLM_TIMEOUT}s")
+                try:
+                    token = await asyncio.wait_for(stream.__anext__(), min(LLM_CHUNK_TIMEOUT, remaining))
+                except StopAsyncIteration:
+                    return
+                yield token
+        finally:
+            await stream.aclose()
@@ -1,13 +1,17 @@
-from fastapi.responses import PlainTextResponse
-from models import Player
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from models import Player, ReportBatch
 import scraper
-from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+import cache
 import database
-import gemini
-from typing import List
+import migrations
+import llm
+import warmup
+from scheduler import SchedulerBusy, scheduler
+from reports import latest_report_key, load_seasons, load_seasons_many, report_cache_key, report_payload
+from typing import AsyncIterator, Dict, List, Literal, Optional
 from dotenv import load_dotenv
 import os
-import redis
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -15,13 +19,18 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import json
 import asyncio
+from contextlib import aclosing
+from sqlalchemy.ext.asyncio import AsyncSession
 
 load_dotenv()
 
 app = FastAPI()
 limiter = Limiter(
     key_func=get_remote_address,
-    storage_uri=os.getenv("REDIS_URL")
+    storage_uri=os.getenv("REDIS_URL"),
+    storage_options={"socket_timeout": cache.REDIS_SOCKET_TIMEOUT, "socket_connect_timeout": cache.REDIS_CONNECT_TIMEOUT}, #slowapi's client is sync, bound each call
+    swallow_errors=True, #A Redis outage must not fail the request
+    in_memory_fallback_enabled=True #Limits are counted per worker until Redis answers again
     )
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -31,6 +40,13 @@ async def startup_event():
     data_dir = Path("data")
     data_dir.mkdir(exist_ok=True)
     print(f"Data directory ensured: {data_dir.absolute()}")
+    provider = llm.get_provider() #Fails here on an unknown LLM_PROVIDER, not on the first report
+    print(f"Reports generated by {provider.name} ({provider.model})")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await database.async_engine.dispose() #Closes pooled connections on this worker's event loop
+    await cache.close()
 
 app.add_middleware(
     CORSMiddleware,
@@ -47,9 +63,8 @@ app.add_middleware(
 )
 
 
-database.Base.metadata.create_all(bind=database.engine)
-redis_client = redis.from_url(os.getenv("REDIS_URL"))
-years = [2025, 2024, 2023, 2022, 2021, 2020]
+migrations.run_migrations(database.engine) #Creates missing tables and applies schema changes create_all can't make
+years = scraper.SEASONS
 
 @app.get("/")
 async def root():
@@ -59,111 +74,115 @@ async def root():
 async def health():
     return {"status": "ok"}
 
-@app.post("/players")
-async def post_players():
+@app.get("/cache/stats")
+async def cache_stats():
+    """Report cache hits and misses per tier for this worker"""
+    return cache.stats()
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """LLM scheduler queue depth, requests in flight and queue waits per priority for this worker"""
+    return scheduler.stats()
+
+def ingest_players(players: List[dict]) -> dict:
+    """Batch upsert on the sync engine, run in a worker thread so the event loop keeps serving requests"""
     db = database.SessionLocal()
     try:
-        players = []
-        for year in years:
-            year_players = await scraper.create_player_models(scraper.process_and_merge_data(float(year)))
-            players = players + year_players
-
-        added_count = 0
-        for player in players:
-            entry = db.query(database.Player).filter(database.Player.player_name == player.get("player_name"), database.Player.year == player.get("year"), database.Player.birth_year == player.get("birth_year")).first()
-            if not entry:
-                new_entry = database.Player(
-                    player_name=player.get("player_name"),
-                    age=player.get("age"),
-                    birth_year=player.get("birth_year"),
-                    position=player.get("position"),
-                    headshot_url=player.get("headshot_url"),
-                    games_played=player.get("games_played"),
-                    minutes_played_per_game=player.get("minutes_played_per_game"),
-                    field_goals_made_per_game=player.get("field_goals_made_per_game"),
-                    field_goal_attempts_per_game=player.get("field_goal_attempts_per_game"),
-                    field_goal_percentage=player.get("field_goal_percentage"),
-                    three_pointers_made_per_game=player.get("three_pointers_made_per_game"),
-                    three_point_attempts_per_game=player.get("three_point_attempts_per_game"),
-                    three_point_percentage=player.get("three_point_percentage"),
-                    two_pointers_made_per_game=player.get("two_pointers_made_per_game"),
-                    two_point_attempts_per_game=player.get("two_point_attempts_per_game"),
-                    two_point_percentage=player.get("two_point_percentage"),
-                    free_throws_made_per_game=player.get("free_throws_made_per_game"),
-                    free_throw_attempts_per_game=player.get("free_throw_attempts_per_game"),
-                    free_throw_percentage=player.get("free_throw_percentage"),
-                    offensive_rebounds_per_game=player.get("offensive_rebounds_per_game"),
-                    defensive_rebounds_per_game=player.get("defensive_rebounds_per_game"),
-                    total_rebounds_per_game=player.get("total_rebounds_per_game"),
-                    assists_per_game=player.get("assists_per_game"),
-                    steals_per_game=player.get("steals_per_game"),
-                    blocks_per_game=player.get("blocks_per_game"),
-                    turnovers_per_game=player.get("turnovers_per_game"),
-                    personal_fouls_per_game=player.get("personal_fouls_per_game"),
-                    points_per_game=player.get("points_per_game"),
-                    offensive_rating=player.get("offensive_rating"),
-                    defensive_rating=player.get("defensive_rating"),
-                    player_efficiency_rating=player.get("player_efficiency_rating"),
-                    true_shooting_percentage=player.get("true_shooting_percentage"),
-                    total_rebound_percentage=player.get("total_rebound_percentage"),
-                    assist_percentage=player.get("assist_percentage"),
-                    steal_percentage=player.get("steal_percentage"),
-                    block_percentage=player.get("block_percentage"),
-                    turnover_percentage=player.get("turnover_percentage"),
-                    usage_percentage=player.get("usage_percentage"),
-                    win_shares=player.get("win_shares"),
-                    win_shares_per_48=player.get("win_shares_per_48"),
-                    box_plus_minus=player.get("box_plus_minus"),
-                    value_over_replacement_player=player.get("value_over_replacement_player"),
-                    two_point_attempt_percentage=player.get("two_point_attempt_percentage"),
-                    layup_dunk_attempt_percentage=player.get("layup_dunk_attempt_percentage"),
-                    short_midrange_attempt_percentage=player.get("short_midrange_attempt_percentage"),
-                    midrange_attempt_percentage=player.get("midrange_attempt_percentage"),
-                    long_midrange_attempt_percentage=player.get("long_midrange_attempt_percentage"),
-                    three_point_attempt_percentage=player.get("three_point_attempt_percentage"),
-                    layup_dunk_made_percentage=player.get("layup_dunk_made_percentage"),
-                    short_midrange_made_percentage=player.get("short_midrange_made_percentage"),
-                    midrange_made_percentage=player.get("midrange_made_percentage"),
-                    long_midrange_made_percentage=player.get("long_midrange_made_percentage"),
-                    two_point_assisted_percentage=player.get("two_point_assisted_percentage"),
-                    three_point_assisted_percentage=player.get("three_point_assisted_percentage"),
-                    corner_three_attempt_percentage=player.get("corner_three_attempt_percentage"),
-                    corner_three_made_percentage=player.get("corner_three_made_percentage"),
-                    year=player.get("year")
-                )
-                db.add(new_entry)
-                added_count += 1
-        
+        counts = database.upsert_players(db, players) #Batched INSERT ... ON CONFLICT, updates rows whose stats changed
         db.commit()
-        return {"message": f"Successfully added {added_count} players to database"}
-    except Exception as e:
+        return counts
+    except Exception:
         db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to add players")
+        raise
     finally:
         db.close()
 
+@app.post("/players")
+async def post_players(seasons: Optional[List[int]] = Query(None)):
+    try:
+        merged = await asyncio.to_thread(scraper.process_and_merge_seasons, seasons or years) #Every season loaded, deduped and merged in one pass
+        rejects = []
+        players = await asyncio.to_thread(scraper.create_player_models, merged, rejects) #Headshot lookups and column work, off the event loop too
 
-@app.get("/players", response_model=List[Player])
-async def get_players():
-    db = database.SessionLocal()
+        counts = await asyncio.to_thread(ingest_players, players)
+        if warmup.WARMUP_AFTER_INGEST_TOP > 0:
+            warmup.start_in_background(warmup.WARMUP_AFTER_INGEST_TOP) #New stats mean new report keys, regenerate the most viewed ones now
+        unresolved = sorted({p.get("player_name") for p in players if not p.get("headshot_url")})
+        return {"message": f"Successfully added {counts['inserted']} players to database", **counts, "unresolved_headshots": unresolved, "rejects": rejects}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to add players")
+
+
+PAGE_SIZE = 100 #Default page for GET /players
+MAX_PAGE_SIZE = 1000 #Bigger pages use format=ndjson, which streams
+
+def parse_cursor(after: str) -> tuple:
+    """ "328:2024" -> (328, 2024.0), the (player_id, year) of the last row already seen """
     try:
-        players = db.query(database.Player).all()
-        return players
+        player_id, year = after.split(":")
+        return int(player_id), float(year)
+    except ValueError:
+        raise ValueError("after must look like <player_id>:<year>")
+
+def format_cursor(row: dict) -> str:
+    return f"{row['player_id']}:{row['year']:g}"
+
+async def ndjson_lines(stmt):
+    async for batch in database.stream_rows(stmt): #Own session, the request's one is closed by the time the body streams
+        yield "".join(json.dumps(row) + "\n" for row in batch)
+
+@app.get("/players")
+async def get_players(
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    db: AsyncSession = Depends(database.get_db),
+):
+    """
+    Player-seasons in (player_id, year) order. json returns one page plus the cursor for the next one,
+    ndjson streams every row after the cursor (or up to limit) one JSON object per line.
+    fields is a comma separated projection, player_id and year are always included.
+    """
+    page_size = min(limit or PAGE_SIZE, MAX_PAGE_SIZE) if format == "json" else limit
+    try:
+        cursor = parse_cursor(after) if after else None
+        projection = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        stmt = database.seasons_page_query(projection, cursor, page_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        return StreamingResponse(ndjson_lines(stmt), media_type="application/x-ndjson")
+    try:
+        players = [dict(r) for r in (await db.execute(stmt)).mappings().all()]
+        next_cursor = format_cursor(players[-1]) if len(players) == page_size else None
+        return {"players": players, "next": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get players")
-    finally:
-        db.close()
+
+async def resolve_player_id(db: AsyncSession, player_name: str, birth_year: int) -> Optional[int]:
+    """Unique index probe on (player_name, birth_year), for the routes that still take a name"""
+    return (await db.execute(database.player_id_query(player_name, birth_year))).scalar()
+
+@app.get("/players/{player_id}/seasons", response_model=List[Player])
+async def get_player_seasons(player_id: int, db: AsyncSession = Depends(database.get_db)):
+    try:
+        seasons = await load_seasons(db, player_id)
+        return seasons #FASTAPI + PYNDANTIC converts this SQLALchemy model to JSON
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Failed to get player")
 
 @app.get("/player/{player_name}", response_model=List[Player])
-async def get_player(player_name: str, birth_year: int):
-    db = database.SessionLocal()
+async def get_player(player_name: str, birth_year: int, db: AsyncSession = Depends(database.get_db)):
     try:
-        player = db.query(database.Player).filter(database.Player.player_name == player_name, database.Player.birth_year == birth_year).all()
-        return player #FASTAPI + PYNDANTIC converts this SQLALchemy model to JSON
+        player_id = await resolve_player_id(db, player_name, birth_year)
+        if player_id is None:
+            return []
+        player = await load_seasons(db, player_id)
+        return player
     except Exception as e:
         raise HTTPException(status_code=400, detail="Failed to get player")
-    finally:
-        db.close()
     """
     OLD CODE:
     players = await scraper.create_player_models(merged)
@@ -187,165 +206,300 @@ async def get_player(player_name: str, birth_year: int):
     """
 
 @app.get("/scrape/players")
-async def scrape_players():
+async def scrape_players(seasons: Optional[List[int]] = Query(None), tables: Optional[List[str]] = Query(None), replay: bool = False, force: bool = False):
+    try:
+        url_dict = scraper.build_url_dict(seasons, tables) #Validates table names before any request goes out
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        await scraper.scrape_all_stats()
-        return {"message": "data successfully scraped"}
+        if replay: #Offline rebuild of the CSVs from the raw page snapshots
+            names = None if seasons is None and tables is None else list(url_dict)
+            replayed = await asyncio.to_thread(scraper.replay_snapshots, names)
+            return {"message": "data successfully replayed", "pages": replayed}
+        scraped = await scraper.scrape_all_stats(seasons, tables, force=force)
+        return {"message": "data successfully scraped", "pages": scraped}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to scrape players")
 
-# Helpers to structure JSON as {year: {stats}}
-def players_to_year_map(players: List[Player]) -> dict:
-    out = {}
-    for p in players: #Iterates season by season
-        d = p.model_dump(mode="json") #Converts a Player object to dict
-        y = d.get("year")
-        key = str(int(y)) if isinstance(y, (int, float)) else str(y) #Makes the "year" key stored as a string
-        stats = {k: v for k, v in d.items() if k != "year"} #Copy everything except year into a dictionary
-        out[key] = stats #Using the year as a key, puts all of stats as a value
-    return out 
-
-def rows_to_year_map(rows) -> dict:
-    pyd = [Player.model_validate(r, from_attributes=True) for r in rows] #Brackets create a list, converts each row into a validated Player object
-    #from_attributes tells Pydantic to look at attributes from the SQLAlchemy row, r.
-    #Normally, Pyndantic expects a dict 
-    return players_to_year_map(pyd)
+def freshness_header(fresh: bool) -> dict:
+    return {"X-Report-Freshness": "fresh" if fresh else "stale"}
 
-@app.get("/generate_report/{player_name}/{birth_year}")
-@limiter.limit("10/minute")
-async def get_player_report(request: Request, player_name: str, birth_year: int):
-    cache_key=f"player:{player_name}:birth-year:{birth_year}"
-    cached_data = redis_client.get(cache_key)
+async def player_report(db: AsyncSession, player_id: int):
+    rows = await load_seasons(db, player_id)
+    if not rows:
+        return {"Error": "Player not found"}
+    player_data = report_payload(rows)
+    key, latest = report_cache_key(player_data), latest_report_key(player_id)
 
-    if cached_data:
-        data = cached_data.decode('utf-8') #converts from bytes to string
-        return PlainTextResponse(content=data)
+    async def generate():
+        return await llm.generate_report(player_data) #Async, the worker keeps serving while the model writes
 
-    db = database.SessionLocal()
+    cached = await cache.lookup(key, alias=latest)
+    if cached is not None:
+        report, fresh = cached
+        if not fresh: #Answer now with what we have, regenerate once in the background
+            cache.revalidate(key, lambda: llm.generate_report(player_data, priority="background"), alias=latest)
+        return PlainTextResponse(content=report, headers=freshness_header(fresh))
+
+    #Miss: one generation per player shared by every concurrent request (in this worker and across workers)
+    report, source = await cache.get_or_generate(key, generate, alias=latest)
+    return PlainTextResponse(content=report, headers=freshness_header(True))
+
+@app.get("/players/{player_id}/report")
+@limiter.limit("10/minute")
+async def get_player_report_by_id(request: Request, player_id: int, db: AsyncSession = Depends(database.get_db)):
     try:
-        rows = db.query(database.Player).filter(database.Player.player_name == player_name, database.Player.birth_year == birth_year).all()
-        if not rows:
+        return await player_report(db, player_id)
+    except SchedulerBusy:
+        raise HTTPException(status_code=503, detail="Too many reports being generated, try again shortly")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to generate report")
+
+@app.get("/generate_report/{player_name}/{birth_year}")
+@limiter.limit("10/minute")
+async def get_player_report(request: Request, player_name: str, birth_year: int, db: AsyncSession = Depends(database.get_db)):
+    try:
+        player_id = await resolve_player_id(db, player_name, birth_year)
+        if player_id is None:
             return {"Error": "Player not found"}
-        year_map = rows_to_year_map(rows)
-        report = gemini.generate_report({"player_name": player_name, "seasons": year_map})
-        redis_client.setex(cache_key, 3600, report)
-        return PlainTextResponse(content=report)
+        return await player_report(db, player_id)
+    except SchedulerBusy:
+        raise HTTPException(status_code=503, detail="Too many reports being generated, try again shortly")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to generate report")
+
+REPORT_BATCH_MAX_PLAYERS = int(os.getenv("REPORT_BATCH_MAX_PLAYERS", "30"))
+REPORT_BATCH_CONCURRENCY = int(os.getenv("REPORT_BATCH_CONCURRENCY", "4")) #Generations at once per batch, on top of the LLM scheduler's limits
+
+async def batch_reports(player_ids: List[int], seasons: Dict[int, list]) -> AsyncIterator[dict]:
+    """
+    One result per player as soon as it is ready: unknown players and cache hits first, then each missing report
+    the moment it is generated. Generation runs at batch priority, behind single reports and ahead of warm-up.
+    Closing the generator (the client went away) cancels the generations still running.
+    """
+    for player_id in player_ids:
+        if player_id not in seasons:
+            yield {"player_id": player_id, "status": "not found"}
+    found = [player_id for player_id in player_ids if player_id in seasons]
+    payloads = {player_id: report_payload(seasons[player_id]) for player_id in found}
+    keys = {player_id: (report_cache_key(payloads[player_id]), latest_report_key(player_id)) for player_id in found}
+
+    misses = []
+    hits = await asyncio.gather(*(cache.lookup(key, alias=latest) for key, latest in keys.values()))
+    for player_id, cached in zip(found, hits):
+        player_data = payloads[player_id]
+        if cached is None:
+            misses.append(player_id)
+            continue
+        report, fresh = cached
+        if not fresh:
+            key, latest = keys[player_id]
+            cache.revalidate(key, lambda data=player_data: llm.generate_report(data, priority="background"), alias=latest)
+        yield {"player_id": player_id, "player_name": player_data["player_name"], "status": "cached", "fresh": fresh, "report": report}
+
+    semaphore = asyncio.Semaphore(max(1, REPORT_BATCH_CONCURRENCY))
+
+    async def generate(player_id: int) -> dict:
+        player_data = payloads[player_id]
+        key, latest = keys[player_id]
+        item = {"player_id": player_id, "player_name": player_data["player_name"]}
+        async with semaphore:
+            try:
+                #Shares the generation with any single request for the same report, in this worker or another
+                report, source = await cache.get_or_generate(key, lambda: llm.generate_report(player_data, priority="batch"), alias=latest)
+            except Exception as e:
+                print(f"Batch report for {item['player_name']} failed: {e!r}")
+                return {**item, "status": "failed", "error": "Failed to generate report"}
+        return {**item, "status": "cached" if source == "cache" else "generated", "fresh": True, "report": report}
+
+    pending = [asyncio.ensure_future(generate(player_id)) for player_id in misses]
+    try:
+        for result in asyncio.as_completed(pending): #In the order they finish, not the order asked for
+            yield await result
     finally:
-        db.close()
+        for task in pending:
+            task.cancel()
+
+async def batch_lines(items: AsyncIterator[dict], format: str):
+    async with aclosing(items) as items: #A disconnect stops the generations now, not when the generator is collected
+        async for item in items:
+            if format == "sse":
+                yield f"event: report\ndata: {json.dumps(item)}\n\n"
+            else:
+                yield json.dumps(item) + "\n"
+    if format == "sse":
+        yield "event: done\ndata: {}\n\n" #EventSource reconnects when a stream just ends
+
+@app.post("/reports/batch")
+@limiter.limit("5/minute")
+async def post_reports_batch(request: Request, batch: ReportBatch, format: Literal["ndjson", "sse"] = "ndjson", db: AsyncSession = Depends(database.get_db)):
+    """
+    Reports for up to REPORT_BATCH_MAX_PLAYERS players, streamed one JSON object per player as each is ready,
+    with status cached, generated, failed or not found. Every player's seasons come from one query.
+    """
+    player_ids = list(dict.fromkeys(batch.player_ids))
+    if not player_ids or len(player_ids) > REPORT_BATCH_MAX_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {REPORT_BATCH_MAX_PLAYERS} player ids")
+    try:
+        seasons = await load_seasons_many(db, player_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to get players")
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(batch_lines(batch_reports(player_ids, seasons), format), media_type=media_type)
 
 @app.get("/players/names")
-async def get_player_names_all():
-    db = database.SessionLocal()
+async def get_player_names_all(
+    sort: Literal["name", "-name", "birth_year", "-birth_year"] = "name",
+    season: Optional[int] = None,
+    position: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
     try:
-        rows = db.query(database.Player).all()
-        unique_players = []
+        #Three columns from the players table, one row per player already, so no dedup pass
+        rows = (await db.execute(database.roster_query(sort, season, position.upper() if position else None))).mappings().all()
         if not rows:
             return {"Error": "No players found"}
-
-        for r in rows: #Loops through all players
-            player_exists = any(
-                existing["player_name"] == r.player_name and existing["birth_year"] == r.birth_year for existing in unique_players
-            ) #Checks to see if ANY are in unique_players
-            
-            if not player_exists:
-                unique_players.append({ #Appends to list if not exists
-                    "player_name": r.player_name,
-                    "birth_year": r.birth_year
-                })
-        #unique_names = [player.get("player_name") for player in unique_players] >>> This gets only names
-        return unique_players
+        return [dict(r) for r in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get player names")
-    finally:
-        db.close()
+
+@app.get("/players/{player_id}/headshot")
+async def get_player_headshot_by_id(player_id: int, db: AsyncSession = Depends(database.get_db)):
+    try:
+        query = (await db.execute(database.player_headshot_query(player_id))).first()
+        if not query:
+            return {"Error": "Player not found"}
+        return {"headshot_url": query.headshot_url}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to get headshot")
 
 @app.get("/player-headshot/{player_name}/{birth_year}")
-async def get_player_headshot(player_name: str, birth_year: int):
-    db = database.SessionLocal()
+async def get_player_headshot(player_name: str, birth_year: int, db: AsyncSession = Depends(database.get_db)):
     try:
-        query = db.query(database.Player).filter(database.Player.player_name == player_name, database.Player.birth_year == birth_year).first()
+        player_id = await resolve_player_id(db, player_name, birth_year)
+        query = (await db.execute(database.player_headshot_query(player_id))).first() if player_id is not None else None
         if not query:
             return {"Error": "Player not found"}
         headshot_url = query.headshot_url
         return {"headshot_url": headshot_url} #returns a JSON object with URL
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get headshot")
+
+async def until_disconnect(websocket: WebSocket, coro):
+    """
+    Awaits coro, cancelling it as soon as the client disconnects (then raises WebSocketDisconnect).
+    Otherwise a closed tab would only be noticed at the next send, after paying for the rest of the generation.
+    """
+    work = asyncio.ensure_future(coro)
+
+    async def disconnected():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass #Clients don't send anything on this socket, ignore it if they do
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
     finally:
-        db.close()
+        watcher.cancel()
+    if not work.done():
+        work.cancel() #Closes the model's stream and releases the report lock, a waiting request takes over
+        try:
+            await work
+        except asyncio.CancelledError:
+            pass
+        raise WebSocketDisconnect()
+    return work.result()
+
+async def stream_report(websocket: WebSocket, player_id: int):
+    """Sends the report for an accepted websocket, from the cache, token by token from the model, or from a concurrent request's generation"""
+    player_name = f"player {player_id}" #Replaced by the real name once the seasons are loaded
+
+    async def generate():
+        try:
+            #Send initial message
+            await websocket.send_text(json.dumps({
+                "type": "start",
+                "content": f"Generating report for {player_name}"
+            }))
+
+            # Stream the report token by token
+            full_report = ""
+            async with aclosing(llm.generate_report_stream(player_data)) as tokens: #Closes the model's stream on cancel or error too
+                async for token in tokens:
+                    if token:
+                        full_report += token
+                        await websocket.send_text(json.dumps({
+                            "type": "token",
+                            "content": token
+                        }))
+                        # Small delay to make streaming visible
+                        await asyncio.sleep(0.05)
+            return full_report #get_or_generate caches it
+        except WebSocketDisconnect:
+            raise cache.GenerationAbandoned() #Anyone waiting on this report generates it instead
 
-@app.websocket("/ws/generate_report/{player_name}/{birth_year}")
-async def websocket_generate_report(websocket: WebSocket, player_name: str, birth_year: int):
-    await websocket.accept()
-    
     try:
-        cache_key = f"player:{player_name}:birth-year:{birth_year}"
-        cached_data = redis_client.get(cache_key)
-        
-        if cached_data:
-            #Send cached data as a single message
-            cached_report = cached_data.decode('utf-8')
+        async with database.AsyncSessionLocal() as db: #Connection goes back to the pool before streaming starts
+            rows = await load_seasons(db, player_id)
+        if not rows:
+            raise LookupError("Player not found")
+        player_name = rows[0].player_name
+        player_data = report_payload(rows)
+        key, latest = report_cache_key(player_data), latest_report_key(player_id)
+
+        cached = await cache.lookup(key, alias=latest)
+        if cached is not None:
+            report, fresh = cached
+            if not fresh: #Regenerated in the background without streaming, the next request gets it fresh
+                cache.revalidate(key, lambda: llm.generate_report(player_data, priority="background"), alias=latest)
             await websocket.send_text(json.dumps({
                 "type": "complete",
-                "content": cached_report,
-                "cached": True
+                "content": report,
+                "cached": True,
+                "fresh": fresh
             }))
             await websocket.close()
             return
-        
-        db = database.SessionLocal()
-        try:
-            rows = db.query(database.Player).filter(
-                database.Player.player_name == player_name, 
-                database.Player.birth_year == birth_year
-            ).all()
-            
-            if not rows:
-                await websocket.send_text(json.dumps({
-                    "type": "error",
-                    "content": "Player not found"
-                }))
-                return
-            
-            year_map = rows_to_year_map(rows)
-            player_data = {"player_name": player_name, "seasons": year_map}
-            
-        finally:
-            db.close()
-        
-        #Send initial message
+
+        report, source = await until_disconnect(websocket, cache.get_or_generate(key, generate, alias=latest))
+
+        if source == "generated":
+            #Send completion message
+            await websocket.send_text(json.dumps({
+                "type": "complete",
+                "content": "Report generation completed.",
+                "cached": False,
+                "fresh": True
+            }))
+        else:
+            #Generated for another request while we waited: send it as a single message
+            await websocket.send_text(json.dumps({
+                "type": "complete",
+                "content": report,
+                "cached": True,
+                "fresh": True
+            }))
+        await websocket.close()
+
+    except LookupError:
         await websocket.send_text(json.dumps({
-            "type": "start",
-            "content": f"Generating report for {player_name}"
+            "type": "error",
+            "content": "Player not found"
         }))
-        
-        # Stream the report token by token
-        full_report = ""
-        async for token in gemini.generate_report_stream(player_data):
-            if token:
-                full_report += token
-                await websocket.send_text(json.dumps({
-                    "type": "token",
-                    "content": token
-                }))
-                # Small delay to make streaming visible
-                await asyncio.sleep(0.05)
-        
-        #Cache the complete report
-        redis_client.setex(cache_key, 3600, full_report)
-        
-        #Send completion message
+    except (WebSocketDisconnect, cache.GenerationAbandoned):
+        print(f"WebSocket disconnected for {player_name}")
+    except SchedulerBusy:
         await websocket.send_text(json.dumps({
-            "type": "complete",
-            "content": "Report generation completed.",
-            "cached": False
+            "type": "error",
+            "content": "Too many reports being generated, try again shortly"
         }))
-        await websocket.close()
-        
-    except WebSocketDisconnect:
-        print(f"WebSocket disconnected for {player_name}")
     except Exception as e:
+        print(f"Report for {player_name} failed: {e!r}")
         try:
             await websocket.send_text(json.dumps({
                 "type": "error",
@@ -354,3 +508,20 @@ async def websocket_generate_report(websocket: WebSocket, player_name: str, birt
         except:
             pass  #Connection might be closed
 
+@app.websocket("/ws/players/{player_id}/report")
+async def websocket_player_report(websocket: WebSocket, player_id: int):
+    await websocket.accept()
+    await stream_report(websocket, player_id)
+
+@app.websocket("/ws/generate_report/{player_name}/{birth_year}")
+async def websocket_generate_report(websocket: WebSocket, player_name: str, birth_year: int):
+    await websocket.accept()
+    async with database.AsyncSessionLocal() as db:
+        player_id = await resolve_player_id(db, player_name, birth_year)
+    if player_id is None:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "content": "Player not found"
+        }))
+        return
+    await stream_report(websocket, player_id)
@@ -0,0 +1,70 @@
+"""
+Moves reports cached under the old keys (player:{name}:birth-year:{year} and player:{id}:report) to the
+content-addressed keys the API reads now, compressed. Each report keeps its remaining TTL, so migrating
+never makes one live longer than it would have. Reports for players no longer in the database are dropped.
+Run from app/ with REDIS_URL and DATABASE_URL set: python migrate_report_keys.py [--dry-run]
+"""
+import argparse
+import re
+import time
+
+import redis
+
+import cache
+import database
+from reports import latest_report_key, report_cache_key, report_payload
+
+LEGACY_NAME_KEY = re.compile(r"player:(?P<name>.+):birth-year:(?P<birth_year>\d+)")
+LEGACY_ID_KEY = re.compile(r"player:(?P<player_id>\d+):report")
+LEGACY_TTL = 3600 #Every old key was written with this TTL, so its age is LEGACY_TTL - remaining
+
+
+def _legacy_player_id(db, key: str):
+    match = LEGACY_ID_KEY.fullmatch(key)
+    if match:
+        return int(match["player_id"])
+    match = LEGACY_NAME_KEY.fullmatch(key)
+    if match:
+        return db.execute(database.player_id_query(match["name"], int(match["birth_year"]))).scalar()
+    return None
+
+
+def migrate(client: redis.Redis, dry_run: bool = False) -> dict:
+    counts = {"moved": 0, "already_there": 0, "dropped": 0}
+    db = database.SessionLocal()
+    try:
+        for raw_key in client.scan_iter(match="player:*", count=500):
+            key = raw_key.decode("utf-8")
+            if not (LEGACY_ID_KEY.fullmatch(key) or LEGACY_NAME_KEY.fullmatch(key)):
+                continue #Not a report
+            player_id = _legacy_player_id(db, key)
+            rows = db.execute(database.player_seasons_query(player_id)).scalars().all() if player_id is not None else []
+            new_key = report_cache_key(report_payload(rows)) if rows else None
+
+            if new_key is None:
+                counts["dropped"] += 1
+            elif client.exists(new_key):
+                counts["already_there"] += 1
+            else:
+                value, ttl_ms = client.get(key), client.pttl(key)
+                if value is None:
+                    continue #Expired while we were looking
+                created = time.time() - (LEGACY_TTL - ttl_ms / 1000) if ttl_ms > 0 else 0.0 #Unknown age counts as stale
+                if not dry_run:
+                    px = ttl_ms if ttl_ms > 0 else cache.REPORT_TTL * 1000
+                    client.set(new_key, cache.encode(value.decode("utf-8"), created), px=px)
+                    client.set(latest_report_key(player_id), cache.encode(new_key, created), px=px) #Served stale after the next stat change
+                counts["moved"] += 1
+            if not dry_run:
+                client.delete(key)
+            print(f"{key} -> {new_key or 'dropped'}")
+    finally:
+        db.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="only print what would be moved")
+    args = parser.parse_args()
+    print(migrate(redis.from_url(cache.REDIS_URL), dry_run=args.dry_run))
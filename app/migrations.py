@@ -0,0 +1,137 @@
+"""
+Minimal schema migrations. create_all only creates missing tables, so anything that changes an existing
+table (indexes, constraints, columns) goes in MIGRATIONS and is applied once, in order, at startup.
+A fresh database gets the current schema from create_all and every migration is recorded as applied.
+Run from app/: python migrations.py [--check-plans]
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+
+import database
+
+
+def _players_unique_key(conn):
+    #Also serves every player_name + birth_year lookup as its leftmost prefix
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_players_name_birth_year_year ON players (player_name, birth_year, year)"
+    ))
+
+
+def _normalize_players(conn):
+    """
+    One row per player-season in players -> players (one row per player) + seasons (player_id, year).
+    The old rows are copied aside first so the new tables can take over the players name, indexes included.
+    """
+    if "year" not in {c["name"] for c in inspect(conn).get_columns("players")}:
+        return #Already normalized
+    conn.execute(text("CREATE TABLE players_legacy AS SELECT * FROM players"))
+    conn.execute(text("DROP TABLE players"))
+    database.Player.__table__.create(conn)
+    database.Season.__table__.create(conn)
+
+    conn.execute(text(
+        "INSERT INTO players (player_name, birth_year, headshot_url) "
+        "SELECT player_name, birth_year, MAX(headshot_url) FROM players_legacy GROUP BY player_name, birth_year"
+    ))
+    columns = ", ".join(c.name for c in database.Season.__table__.columns if c.name != "player_id")
+    selected = ", ".join(f"l.{c.name}" for c in database.Season.__table__.columns if c.name != "player_id")
+    conn.execute(text(
+        f"INSERT INTO seasons (player_id, {columns}) SELECT p.id, {selected} FROM players_legacy l "
+        "JOIN players p ON p.player_name = l.player_name AND p.birth_year = l.birth_year"
+    ))
+    conn.execute(text("DROP TABLE players_legacy"))
+
+
+MIGRATIONS = [ #(version, description, apply(conn)), append only
+    (1, "players unique key (player_name, birth_year, year)", _players_unique_key),
+    (2, "split players into players (one per player) and seasons (player_id, year)", _normalize_players),
+]
+
+
+def _record(conn, version: int, description: str):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+        {"v": version, "d": description, "t": datetime.now(timezone.utc).isoformat()},
+    )
+
+
+def run_migrations(bind=database.engine) -> list:
+    """Brings the schema up to date: applies every pending migration in its own transaction, then creates any missing tables"""
+    with bind.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at VARCHAR NOT NULL)"
+        ))
+        done = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+        if not inspect(conn).has_table("players"): #Fresh database, create_all builds the current schema directly
+            database.Base.metadata.create_all(bind=conn)
+            for version, description, _ in MIGRATIONS:
+                if version not in done:
+                    _record(conn, version, description)
+            return []
+
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn: #Migration and its bookkeeping row commit together
+            apply(conn)
+            _record(conn, version, description)
+        applied.append(version)
+        print(f"Applied migration {version}: {description}")
+    database.Base.metadata.create_all(bind=bind) #Tables added since the last migration
+    return applied
+
+
+def lookup_queries() -> dict:
+    """The statements behind GET /players, /players/names, the /players/{player_id}/... routes, the websocket, POST /reports/batch, and the name -> id lookup of the older routes"""
+    return {
+        "player id": database.player_id_query("LeBron James", 1984),
+        "player seasons": database.player_seasons_query(1),
+        "seasons for a batch of players": database.players_seasons_query([1, 2, 3]),
+        "player headshot": database.player_headshot_query(1),
+        "roster": database.roster_query(),
+        "roster for a season and position": database.roster_query(season=2025, position="PG"),
+        "player-seasons page after a cursor": database.seasons_page_query(after=(500, 2023.0), limit=100),
+    }
+
+
+def _plan(conn, stmt) -> str:
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SET LOCAL enable_seqscan = off")) #Tiny tables would pick a seq scan anyway, only fall back to one if no index fits
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        return json.dumps(plan)
+    if conn.dialect.name == "sqlite":
+        return "\n".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    raise NotImplementedError(f"No query plan check for {conn.dialect.name}")
+
+
+def _is_full_scan(dialect: str, plan: str) -> bool:
+    if dialect == "postgresql":
+        return '"Seq Scan"' in plan
+    return any(line.startswith("SCAN ") and "USING" not in line for line in plan.splitlines()) #SQLite says SCAN t vs SEARCH t USING INDEX
+
+
+def check_query_plans(bind=database.engine) -> dict:
+    """Raises AssertionError if any player lookup would read the whole table, returns {name: plan}"""
+    plans = {}
+    with bind.connect() as conn:
+        for name, stmt in lookup_queries().items():
+            with conn.begin():
+                plans[name] = _plan(conn, stmt)
+            if _is_full_scan(conn.dialect.name, plans[name]):
+                raise AssertionError(f"{name} lookup does a full table scan on {conn.dialect.name}:\n{plans[name]}")
+    return plans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check-plans", action="store_true", help="fail if a player lookup would do a full table scan")
+    args = parser.parse_args()
+    run_migrations()
+    if args.check_plans:
+        for name, plan in check_query_plans().items():
+            print(f"{name}: ok\n  {plan[:300]}")
@@ -1,7 +1,8 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class Player(BaseModel):
+    player_id: Optional[int] = None #Set once the row is in the database
     year: float
     player_name: str
     age: float
@@ -74,4 +75,7 @@ class Player(BaseModel):
 
     class Config:
         from_attributes = True #Lets Pyndantic accept SQLAlchemy models
-        #SQLAlchemy models cannot be serialized into JSON
\ No newline at end of file
+        #SQLAlchemy models cannot be serialized into JSON
+
+class ReportBatch(BaseModel):
+    player_ids: List[int] #Ids from GET /players/names, reports come back as each one is ready
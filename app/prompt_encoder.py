@@ -0,0 +1,196 @@
+"""
+Compact encoding of a player's seasons for the report prompt: identity once, stat columns once, one row per season.
+Labels follow Basketball Reference, fractions are written as percentages, and numbers are rounded to PROMPT_DIGITS.
+PROMPT_STATS picks the columns (comma-separated sets from STAT_SETS).
+Run from app/ to compare it with the old payload for every player in the database:
+python prompt_encoder.py [--stats core,shooting] [--digits 1] [--count-tokens 20]
+"""
+import argparse
+import asyncio
+import math
+import os
+import re
+import statistics
+from typing import List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROMPT_STATS = os.getenv("PROMPT_STATS", "all")
+PROMPT_DIGITS = int(os.getenv("PROMPT_DIGITS", "1")) #Decimals kept on every number, percentages included
+
+#(label, Season attribute, kind): "pct" is stored as a fraction and written as a percentage, "ratio" keeps 3 decimals
+COLUMNS: List[Tuple[str, str, str]] = [
+    ("G", "games_played", "num"),
+    ("MP", "minutes_played_per_game", "num"),
+    ("FG", "field_goals_made_per_game", "num"),
+    ("FGA", "field_goal_attempts_per_game", "num"),
+    ("FG%", "field_goal_percentage", "pct"),
+    ("3P", "three_pointers_made_per_game", "num"),
+    ("3PA", "three_point_attempts_per_game", "num"),
+    ("3P%", "three_point_percentage", "pct"),
+    ("2P", "two_pointers_made_per_game", "num"),
+    ("2PA", "two_point_attempts_per_game", "num"),
+    ("2P%", "two_point_percentage", "pct"),
+    ("FT", "free_throws_made_per_game", "num"),
+    ("FTA", "free_throw_attempts_per_game", "num"),
+    ("FT%", "free_throw_percentage", "pct"),
+    ("ORB", "offensive_rebounds_per_game", "num"),
+    ("DRB", "defensive_rebounds_per_game", "num"),
+    ("TRB", "total_rebounds_per_game", "num"),
+    ("AST", "assists_per_game", "num"),
+    ("STL", "steals_per_game", "num"),
+    ("BLK", "blocks_per_game", "num"),
+    ("TOV", "turnovers_per_game", "num"),
+    ("PF", "personal_fouls_per_game", "num"),
+    ("PTS", "points_per_game", "num"),
+    ("ORtg", "offensive_rating", "num"),
+    ("DRtg", "defensive_rating", "num"),
+    ("PER", "player_efficiency_rating", "num"),
+    ("TS%", "true_shooting_percentage", "pct"),
+    ("TRB%", "total_rebound_percentage", "num"),
+    ("AST%", "assist_percentage", "num"),
+    ("STL%", "steal_percentage", "num"),
+    ("BLK%", "block_percentage", "num"),
+    ("TOV%", "turnover_percentage", "num"),
+    ("USG%", "usage_percentage", "num"),
+    ("WS", "win_shares", "num"),
+    ("WS/48", "win_shares_per_48", "ratio"),
+    ("BPM", "box_plus_minus", "num"),
+    ("VORP", "value_over_replacement_player", "num"),
+    ("2PA/FGA%", "two_point_attempt_percentage", "pct"),
+    ("Rim FGA%", "layup_dunk_attempt_percentage", "pct"),
+    ("Short Mid FGA%", "short_midrange_attempt_percentage", "pct"),
+    ("Mid FGA%", "midrange_attempt_percentage", "pct"),
+    ("Long Mid FGA%", "long_midrange_attempt_percentage", "pct"),
+    ("3PA/FGA%", "three_point_attempt_percentage", "pct"),
+    ("Rim FG%", "layup_dunk_made_percentage", "pct"),
+    ("Short Mid FG%", "short_midrange_made_percentage", "pct"),
+    ("Mid FG%", "midrange_made_percentage", "pct"),
+    ("Long Mid FG%", "long_midrange_made_percentage", "pct"),
+    ("%Ast'd 2P", "two_point_assisted_percentage", "pct"),
+    ("%Ast'd 3P", "three_point_assisted_percentage", "pct"),
+    ("Corner 3PA%", "corner_three_attempt_percentage", "pct"),
+    ("Corner 3P%", "corner_three_made_percentage", "pct"),
+]
+
+STAT_SETS = {
+    "all": [label for label, _, _ in COLUMNS],
+    "core": ["G", "MP", "PTS", "TRB", "AST", "STL", "BLK", "TOV", "FG%", "3P%", "3PA", "FT%", "FTA"],
+    "box": [label for label, _, _ in COLUMNS[:23]],
+    "advanced": ["ORtg", "DRtg", "PER", "TS%", "TRB%", "AST%", "STL%", "BLK%", "TOV%", "USG%", "WS", "WS/48", "BPM", "VORP"],
+    "shooting": [label for label, _, _ in COLUMNS[37:]],
+}
+
+
+def select_columns(stats: str = PROMPT_STATS) -> List[Tuple[str, str, str]]:
+    """Columns for a comma-separated list of STAT_SETS names, in COLUMNS order"""
+    labels = set()
+    for name in filter(None, (s.strip() for s in stats.split(","))):
+        if name not in STAT_SETS:
+            raise ValueError(f"Unknown stat set {name!r}, pick from {', '.join(STAT_SETS)}")
+        labels.update(STAT_SETS[name])
+    return [column for column in COLUMNS if column[0] in labels]
+
+
+def format_number(value: Optional[float], kind: str = "num", digits: int = PROMPT_DIGITS) -> str:
+    """Rounded with trailing zeros dropped: 116.0 -> 116, 0.493 -> 49.3 as a percentage, missing -> -"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "-"
+    if kind == "pct":
+        value *= 100
+    text = f"{value:.{3 if kind == 'ratio' else digits}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if kind == "ratio":
+        if text.startswith("0."): #.204, like the box score
+            text = text[1:]
+        elif text.startswith("-0."):
+            text = "-" + text[2:]
+    return "0" if text in ("-0", "") else text
+
+
+def encode_seasons(rows: Sequence, stats: str = PROMPT_STATS, digits: int = PROMPT_DIGITS) -> str:
+    """
+    rows are one player's seasons (database.Season, or anything with the same attributes), oldest first.
+    Position is stated once unless it changed between seasons, then it gets a column.
+    """
+    columns = select_columns(stats)
+    first = rows[0]
+    positions = list(dict.fromkeys(r.position for r in rows))
+    identity = f"{first.player_name}, born {format_number(first.birth_year, digits=0)}"
+    if len(positions) == 1:
+        identity += f", {positions[0]}"
+
+    header = ["Season", "Age"] + (["Pos"] if len(positions) > 1 else []) + [label for label, _, _ in columns]
+    lines = [identity, ",".join(header)]
+    for r in rows:
+        cells = [format_number(r.year, digits=0), format_number(r.age, digits=0)]
+        if len(positions) > 1:
+            cells.append(r.position)
+        cells += [format_number(getattr(r, field), kind, digits) for _, field, kind in columns]
+        lines.append(",".join(cells))
+    return "\n".join(lines)
+
+
+_TOKEN = re.compile(r"\d|[A-Za-z]+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline estimate for Gemini's tokenizer: every digit and symbol is a token and words cost one per 4 letters.
+    Good for comparing encodings, use --count-tokens for the provider's own count.
+    """
+    return sum(1 if len(piece) < 5 else math.ceil(len(piece) / 4) for piece in _TOKEN.findall(text))
+
+
+async def _count_tokens(provider, texts: List[str]) -> List[int]:
+    return [await provider.count_tokens(text) for text in texts]
+
+
+def accounting(stats: str = PROMPT_STATS, digits: int = PROMPT_DIGITS, count_tokens: int = 0):
+    """Bytes and tokens of the old payload (repr of every field, every season) vs encode_seasons, for every player"""
+    import database
+    import llm
+    from reports import rows_to_year_map
+
+    db = database.SessionLocal()
+    try:
+        player_ids = db.execute(database.select(database.Player.id).order_by(database.Player.id)).scalars().all()
+        pairs = []
+        for player_id in player_ids:
+            rows = db.execute(database.player_seasons_query(player_id)).scalars().all()
+            if rows:
+                old = str({"player_name": rows[0].player_name, "seasons": rows_to_year_map(rows)})
+                pairs.append((old, encode_seasons(rows, stats, digits)))
+    finally:
+        db.close()
+    if not pairs:
+        print("No players in the database, run POST /players first")
+        return
+
+    print(f"{len(pairs)} players, stats={stats} digits={digits}")
+    print(f"  {'':22s} {'old':>10s} {'compact':>10s} {'saved':>7s}")
+    for label, measure in (("bytes", lambda t: len(t.encode("utf-8"))), ("tokens (estimate)", estimate_tokens)):
+        old = [measure(o) for o, _ in pairs]
+        new = [measure(n) for _, n in pairs]
+        for stat, fn in (("total", sum), ("mean", statistics.mean), ("p95", lambda v: statistics.quantiles(v, n=20)[-1])):
+            o, n = fn(old), fn(new)
+            print(f"  {label + ' ' + stat:22s} {o:10.0f} {n:10.0f} {1 - n / o:7.1%}")
+
+    if count_tokens:
+        sample = pairs[:count_tokens]
+        provider = llm.get_provider()
+        counts = asyncio.run(_count_tokens(provider, [text for pair in sample for text in pair]))
+        old, new = counts[0::2], counts[1::2]
+        print(f"  {provider.name} count_tokens, first {len(sample)} players: {sum(old)} -> {sum(new)} tokens ({1 - sum(new) / sum(old):.1%} saved)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stats", default=PROMPT_STATS, help=f"comma-separated stat sets: {', '.join(STAT_SETS)}")
+    parser.add_argument("--digits", type=int, default=PROMPT_DIGITS)
+    parser.add_argument("--count-tokens", type=int, default=0, metavar="N", help="also count exact tokens for N players with the LLM provider's tokenizer")
+    args = parser.parse_args()
+    accounting(args.stats, args.digits, args.count_tokens)
@@ -0,0 +1,52 @@
+"""
+What a scouting report is generated from, and where it is cached: shared by the API, warmup.py and migrate_report_keys.py
+"""
+from typing import Dict, List, Sequence
+
+import cache
+import database
+import llm
+from models import Player
+from prompt_encoder import encode_seasons
+
+
+# Helpers to structure JSON as {year: {stats}}
+def players_to_year_map(players: List[Player]) -> dict:
+    out = {}
+    for p in players: #Iterates season by season
+        d = p.model_dump(mode="json") #Converts a Player object to dict
+        y = d.get("year")
+        key = str(int(y)) if isinstance(y, (int, float)) else str(y) #Makes the "year" key stored as a string
+        stats = {k: v for k, v in d.items() if k not in ("year", "player_id")} #Copy everything except year (and the row id) into a dictionary
+        out[key] = stats #Using the year as a key, puts all of stats as a value
+    return out 
+
+def rows_to_year_map(rows) -> dict:
+    pyd = [Player.model_validate(r, from_attributes=True) for r in rows] #Brackets create a list, converts each row into a validated Player object
+    #from_attributes tells Pydantic to look at attributes from the SQLAlchemy row, r.
+    #Normally, Pyndantic expects a dict 
+    return players_to_year_map(pyd)
+
+def report_payload(rows) -> dict:
+    #The seasons as a compact table (prompt_encoder): a fraction of the tokens of rows_to_year_map's nested dict
+    return {"player_name": rows[0].player_name, "stats": encode_seasons(rows)}
+
+def report_cache_key(player_data: dict) -> str:
+    #Everything the report is generated from: new stats, prompt or model -> new key, so cached reports never go stale
+    provider = llm.get_provider()
+    return cache.content_key("report", {"provider": provider.name, "model": provider.model, "prompt": llm.PROMPT_VERSION, "player": player_data})
+
+def latest_report_key(player_id: int) -> str:
+    return f"report:player:{player_id}:latest" #Points at the player's last generated report, served stale after new stats
+
+
+async def load_seasons(db, player_id: int) -> list:
+    return (await db.execute(database.player_seasons_query(player_id))).scalars().all()
+
+
+async def load_seasons_many(db, player_ids: Sequence[int]) -> Dict[int, list]:
+    """{player_id: seasons} in one query, players without seasons are left out"""
+    seasons = {}
+    for row in (await db.execute(database.players_seasons_query(player_ids))).scalars().all():
+        seasons.setdefault(row.player_id, []).append(row)
+    return seasons
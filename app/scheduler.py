@@ -0,0 +1,261 @@
+"""
+Admission control for every LLM request: llm.generate_report and llm.generate_report_stream wait here for a slot.
+Caps requests in flight, requests per minute and tokens per minute. Waiters are served by priority class, then
+in arrival order, and every class below interactive (batch reports, then warm-up and revalidation) may only use
+LLM_BACKGROUND_SHARE of each budget, so single reports users are waiting on always find headroom.
+
+With Redis (REDIS_URL) the budgets are shared by every worker: requests in flight are leases in a sorted set
+(they expire, so a crashed worker's leases free themselves) and the per-minute budgets are counters for the
+current minute. Without Redis, or while it is unreachable, each worker enforces the budgets on its own over a
+sliding minute.
+Tokens are budgeted up front: the prompt's estimate plus LLM_OUTPUT_TOKENS for the report.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from redis.exceptions import RedisError, WatchError
+
+import cache
+from prompt_encoder import estimate_tokens
+
+load_dotenv()
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16")) #0 = unlimited, for every budget
+LLM_RPM = float(os.getenv("LLM_RPM", "0")) #Set both to the provider's quota
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_BACKGROUND_SHARE = float(os.getenv("LLM_BACKGROUND_SHARE", "0.5")) #Of each budget, the rest is kept for interactive requests
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30")) #Interactive requests give up (503) after waiting this long
+LLM_BACKGROUND_QUEUE_TIMEOUT = float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT", "600")) #Batch and background requests fail after this
+LLM_OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS", "1000")) #Budgeted per request for the report itself
+LLM_LEASE_TTL = float(os.getenv("LLM_LEASE_TTL", "150")) #Longer than LLM_TIMEOUT, a crashed worker's requests stop counting after this
+POLL_INTERVAL = 0.2 #Other workers' releases aren't announced, waiters recheck Redis this often
+
+PRIORITIES = {"interactive": 0, "batch": 1, "background": 2} #Lower goes first
+
+
+class SchedulerBusy(Exception):
+    """No slot within the queue timeout"""
+
+
+class Lease:
+    def __init__(self, priority: str, tokens: int, shared: bool):
+        self.id = uuid.uuid4().hex
+        self.priority = priority
+        self.tokens = tokens
+        self.shared = shared #Counted in Redis rather than only in this worker
+
+
+def request_tokens(prompt: str) -> int:
+    return estimate_tokens(prompt) + LLM_OUTPUT_TOKENS
+
+
+class Scheduler:
+    def __init__(
+        self,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        background_share: float = LLM_BACKGROUND_SHARE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        background_queue_timeout: float = LLM_BACKGROUND_QUEUE_TIMEOUT,
+        shared: Optional[bool] = None,
+        namespace: str = "llm",
+        window: float = 60.0,
+    ):
+        """shared=None uses Redis whenever REDIS_URL is set. window is the budget period, a minute outside of benchmarks"""
+        self.max_in_flight = max_in_flight
+        self.rpm = rpm
+        self.tpm = tpm
+        self.background_share = background_share
+        self.queue_timeout = queue_timeout
+        self.background_queue_timeout = background_queue_timeout
+        self.shared = shared
+        self.namespace = namespace
+        self.window = window
+        self.in_flight = 0 #In this worker
+        self._recent: Deque[Tuple[float, int]] = deque() #(admitted at, tokens) within the window, when not shared
+        self._queue: List[Tuple[int, int]] = [] #Heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop = None
+        self._redis_down_since = 0.0
+        self._stats = {
+            name: {"queued": 0, "admitted": 0, "timed_out": 0, "waits": deque(maxlen=1000)} for name in PRIORITIES
+        }
+
+    def _shared(self) -> bool:
+        if self.shared is None:
+            return bool(cache.REDIS_URL)
+        return self.shared
+
+    def _condition(self) -> asyncio.Condition:
+        """Created inside the running event loop, scripts run one loop after another on the same scheduler"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._changed, self._loop = asyncio.Condition(), loop
+        return self._changed
+
+    def _cap(self, limit: float, priority: str) -> float:
+        return limit if PRIORITIES[priority] == 0 else limit * self.background_share
+
+    def _admit_local(self, priority: str, tokens: int) -> Tuple[Optional[Lease], Optional[float]]:
+        now = time.monotonic()
+        while self._recent and self._recent[0][0] <= now - self.window:
+            self._recent.popleft()
+        retry_after = self._recent[0][0] + self.window - now if self._recent else None
+        if self.max_in_flight and self.in_flight >= max(1, int(self._cap(self.max_in_flight, priority))):
+            return None, None #Woken by a release
+        if self.rpm and len(self._recent) >= max(1, int(self._cap(self.rpm, priority))):
+            return None, retry_after
+        used = sum(t for _, t in self._recent)
+        if self.tpm and self._recent and used + tokens > self._cap(self.tpm, priority):
+            return None, retry_after #A request bigger than the whole budget still goes through on an empty window
+        self._recent.append((now, tokens))
+        return Lease(priority, tokens, shared=False), None
+
+    async def _admit_shared(self, priority: str, tokens: int) -> Tuple[Optional[Lease], Optional[float]]:
+        now = time.time()
+        period = int(now // self.window)
+        in_flight_key = f"{self.namespace}:in-flight"
+        requests_key, tokens_key = f"{self.namespace}:requests:{period}", f"{self.namespace}:tokens:{period}"
+        next_period = (period + 1) * self.window - now
+        try:
+            async with cache.get_client().pipeline(transaction=True) as pipe:
+                await pipe.watch(in_flight_key, requests_key, tokens_key)
+                in_flight = await pipe.zcount(in_flight_key, now, "+inf") #Expired leases don't count
+                requests = int(await pipe.get(requests_key) or 0)
+                used = int(await pipe.get(tokens_key) or 0)
+                if self.max_in_flight and in_flight >= max(1, int(self._cap(self.max_in_flight, priority))):
+                    await pipe.unwatch()
+                    return None, POLL_INTERVAL
+                if self.rpm and requests >= max(1, int(self._cap(self.rpm, priority))):
+                    await pipe.unwatch()
+                    return None, next_period
+                if self.tpm and requests and used + tokens > self._cap(self.tpm, priority):
+                    await pipe.unwatch()
+                    return None, next_period
+                lease = Lease(priority, tokens, shared=True)
+                pipe.multi()
+                pipe.zremrangebyscore(in_flight_key, "-inf", now)
+                pipe.zadd(in_flight_key, {lease.id: now + LLM_LEASE_TTL})
+                pipe.expire(in_flight_key, int(LLM_LEASE_TTL) + 1)
+                pipe.incr(requests_key)
+                pipe.incrby(tokens_key, tokens)
+                pipe.expire(requests_key, int(self.window * 2) + 1)
+                pipe.expire(tokens_key, int(self.window * 2) + 1)
+                await pipe.execute()
+                self._redis_down_since = 0.0
+                return lease, None
+        except WatchError:
+            return None, 0 #Another worker took a slot meanwhile, look again
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            if not self._redis_down_since:
+                print(f"Redis unavailable, LLM budgets are per worker until it is back: {e!r}")
+            self._redis_down_since = now
+            return self._admit_local(priority, tokens)
+
+    async def acquire(self, priority: str = "interactive", tokens: int = 0) -> Lease:
+        """Waits for a slot, in priority order. Raises SchedulerBusy past the queue timeout of the request's class (0 = none)"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, pick from {', '.join(PRIORITIES)}")
+        stats = self._stats[priority]
+        entry = (PRIORITIES[priority], next(self._arrivals))
+        t0 = time.monotonic()
+        queue_timeout = self.queue_timeout if PRIORITIES[priority] == 0 else self.background_queue_timeout
+        deadline = t0 + queue_timeout if queue_timeout > 0 else None
+        changed = self._condition()
+        async with changed:
+            heapq.heappush(self._queue, entry)
+            stats["queued"] += 1
+            try:
+                while True:
+                    lease, retry_after = None, None
+                    if self._queue[0] == entry: #Only the first in line asks, so nobody jumps ahead of it
+                        if self._shared():
+                            #Shielded: a cancelled pipeline would leave its connection mid-transaction
+                            attempt = asyncio.ensure_future(self._admit_shared(priority, tokens))
+                            try:
+                                lease, retry_after = await asyncio.shield(attempt)
+                            except asyncio.CancelledError:
+                                attempt.add_done_callback(self._abandoned)
+                                raise
+                            if lease is None and retry_after is None:
+                                retry_after = POLL_INTERVAL
+                        else:
+                            lease, retry_after = self._admit_local(priority, tokens)
+                        if lease is not None:
+                            self.in_flight += 1
+                            break
+                    timeout = retry_after
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            stats["timed_out"] += 1
+                            raise SchedulerBusy(f"No LLM slot after {queue_timeout}s in the queue")
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                stats["queued"] -= 1
+                changed.notify_all() #The next in line may go now
+        stats["admitted"] += 1
+        stats["waits"].append(time.monotonic() - t0)
+        return lease
+
+    def _abandoned(self, attempt: asyncio.Future):
+        """Gives back a lease won by a request that was cancelled while waiting for it"""
+        if not attempt.cancelled() and attempt.exception() is None:
+            lease, _ = attempt.result()
+            if lease is not None:
+                asyncio.ensure_future(self._drop(lease))
+
+    async def _drop(self, lease: Lease):
+        if lease.shared:
+            try:
+                await cache.get_client().zrem(f"{self.namespace}:in-flight", lease.id)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                print(f"Redis unavailable, LLM lease {lease.id} will expire on its own: {e!r}")
+
+    async def release(self, lease: Lease):
+        self.in_flight -= 1
+        await self._drop(lease)
+        changed = self._condition()
+        async with changed:
+            changed.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", tokens: int = 0):
+        lease = await self.acquire(priority, tokens)
+        try:
+            yield lease
+        finally:
+            await asyncio.shield(self.release(lease)) #Runs to the end even if the request is cancelled meanwhile
+
+    def stats(self) -> dict:
+        out = {"scope": "all workers" if self._shared() else "this worker", "in_flight": self.in_flight}
+        for name, s in self._stats.items():
+            waits = sorted(s["waits"]) or [0.0] #Last 1000 admissions
+            out[name] = {
+                "queued": s["queued"],
+                "admitted": s["admitted"],
+                "timed_out": s["timed_out"],
+                "wait_ms_p50": round(waits[int(0.5 * (len(waits) - 1))] * 1000, 1),
+                "wait_ms_p95": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 1),
+                "wait_ms_max": round(waits[-1] * 1000, 1),
+            }
+        return out
+
+
+scheduler = Scheduler() #Every LLM request in this worker
@@ -1,19 +1,123 @@
 import os
+import asyncio
 import pandas as pd
 import httpx
 from io import StringIO  
-from bs4 import BeautifulSoup, Comment
 from models import Player
-from nba_api.stats.static import players as nba_players
+from pydantic import TypeAdapter, ValidationError
 from fastapi import HTTPException
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 from pathlib import Path
 from dotenv import load_dotenv
+from fetcher import PageFetcher
+import snapshots
+import headshots
+import stat_store
+from table_extractor import parse_bref_table
 
 load_dotenv()
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 
+BREF_BASE_URL = "https://www.basketball-reference.com/leagues"
+STAT_PAGES = { #csv prefix -> Basketball Reference page suffix
+    "per_game": "per_game",
+    "per_100_poss": "per_poss",
+    "advanced": "advanced",
+    "shooting": "shooting",
+}
+STAT_TABLE_IDS = { #csv prefix -> id of the stats <table> on the page
+    "per_game": "per_game_stats",
+    "per_100_poss": "per_poss_stats",
+    "advanced": "advanced",
+    "shooting": "shooting",
+}
+SEASONS = [2025, 2024, 2023, 2022, 2021, 2020]
+PLAYER_FIELDS = list(Player.model_fields)
+PLAYER_LIST = TypeAdapter(List[Player]) #Validates a whole ingest batch in one call
+MULTI_TEAM_PATTERN = r"\d+TM" #"2TM", "3TM", ... rows hold a traded player's combined stats
+
+# PICK THE COLUMNS I WANT + RENAMING THEM (stat store column -> Player field)
+PER_GAME_COLUMNS = {
+    "Player": "player_name",
+    "Age": "age",
+    "Team": "team",
+    "Pos": "position",
+    "G": "games_played",
+    "MP": "minutes_played_per_game",
+    "FG": "field_goals_made_per_game",
+    "FGA": "field_goal_attempts_per_game",
+    "FG%": "field_goal_percentage",
+    "3P": "three_pointers_made_per_game",
+    "3PA": "three_point_attempts_per_game",
+    "3P%": "three_point_percentage",
+    "2P": "two_pointers_made_per_game",
+    "2PA": "two_point_attempts_per_game",
+    "2P%": "two_point_percentage",
+    "FT": "free_throws_made_per_game",
+    "FTA": "free_throw_attempts_per_game",
+    "FT%": "free_throw_percentage",
+    "ORB": "offensive_rebounds_per_game",
+    "DRB": "defensive_rebounds_per_game",
+    "TRB": "total_rebounds_per_game",
+    "AST": "assists_per_game",
+    "STL": "steals_per_game",
+    "BLK": "blocks_per_game",
+    "TOV": "turnovers_per_game",
+    "PF": "personal_fouls_per_game",
+    "PTS": "points_per_game",
+}
+
+PER_100_POSS_COLUMNS = {
+    "Player": "player_name",
+    "Age": "age",
+    "Team": "team",
+    "ORtg": "offensive_rating",
+    "DRtg": "defensive_rating",
+}
+
+ADVANCED_COLUMNS = {
+    "Player": "player_name",
+    "Age": "age",
+    "Team": "team",
+    "PER": "player_efficiency_rating",
+    "TS%": "true_shooting_percentage",
+    "TRB%": "total_rebound_percentage",
+    "AST%": "assist_percentage",
+    "STL%": "steal_percentage",
+    "BLK%": "block_percentage",
+    "TOV%": "turnover_percentage",
+    "USG%": "usage_percentage",
+    "WS": "win_shares",
+    "WS/48": "win_shares_per_48",
+    "BPM": "box_plus_minus",
+    "VORP": "value_over_replacement_player",
+}
+
+SHOOTING_COLUMNS = {
+    "Player": "player_name",
+    "Age": "age",
+    "Team": "team",
+    "% of FGA by Distance/2P": "two_point_attempt_percentage",
+    "% of FGA by Distance/0-3": "layup_dunk_attempt_percentage",
+    "% of FGA by Distance/3-10": "short_midrange_attempt_percentage",
+    "% of FGA by Distance/10-16": "midrange_attempt_percentage",
+    "% of FGA by Distance/16-3P": "long_midrange_attempt_percentage",
+    "% of FGA by Distance/3P": "three_point_attempt_percentage",
+    "FG% by Distance/0-3": "layup_dunk_made_percentage",
+    "FG% by Distance/3-10": "short_midrange_made_percentage",
+    "FG% by Distance/10-16": "midrange_made_percentage",
+    "FG% by Distance/16-3P": "long_midrange_made_percentage",
+    "% of FG Ast'd/2P": "two_point_assisted_percentage",
+    "% of FG Ast'd/3P": "three_point_assisted_percentage",
+    "Corner 3s/%3PA": "corner_three_attempt_percentage",
+    "Corner 3s/3P%": "corner_three_made_percentage",
+}
+
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+SCRAPE_MIN_INTERVAL = float(os.getenv("SCRAPE_MIN_INTERVAL", "3.0")) #Basketball Reference allows ~20 requests/minute
+SCRAPE_MAX_RETRIES = int(os.getenv("SCRAPE_MAX_RETRIES", "4"))
+
 
 def get_bref_stats_v1(url, csv_name): #Legacy code right here, for learning and review purposes
     html_content = httpx.get(url).text #Downloads page's HTML as a string
@@ -24,249 +128,200 @@ def get_bref_stats_v1(url, csv_name): #Legacy code right here, for learning and
     df.to_csv(f"data/{csv_name}.csv", index=False) #Turns df into .csv file
 
 
-def get_bref_stats(url, csv_name): #This version accounts for tables hidden inside HTML comments
-    
-    html_content = httpx.get(url).text
-    soup = BeautifulSoup(html_content, "lxml")
-
-    comment = soup.find(string=lambda text: isinstance(text, Comment) and "<table" in text)
-    if comment:
-        df = pd.read_html(str(BeautifulSoup(comment, "lxml")))[0]
-        out = DATA_DIR / f"{csv_name}.csv"
-        df.to_csv(out, index=False)
-        return
-    
-    df = pd.read_html(StringIO(html_content))[0]
-    # Ensure data directory exists and save file
-    out = DATA_DIR / f"{csv_name}.csv"
-    df.to_csv(out, index=False)
-    #df.to_csv(f"data/{csv_name}.csv", index=False)
-
-
-async def scrape_all_stats():
-    """Scrape all basketball statistics from Basketball Reference"""
-    url_dict = {}
-    url_dict["per_game_2025"] = "https://www.basketball-reference.com/leagues/NBA_2025_per_game.html"
-    url_dict["per_100_poss_2025"] = "https://www.basketball-reference.com/leagues/NBA_2025_per_poss.html"
-    url_dict["advanced_2025"] = "https://www.basketball-reference.com/leagues/NBA_2025_advanced.html"
-    url_dict["shooting_2025"] = "https://www.basketball-reference.com/leagues/NBA_2025_shooting.html"
-    url_dict["per_game_2024"] = "https://www.basketball-reference.com/leagues/NBA_2024_per_game.html"
-    url_dict["per_100_poss_2024"] = "https://www.basketball-reference.com/leagues/NBA_2024_per_poss.html"
-    url_dict["advanced_2024"] = "https://www.basketball-reference.com/leagues/NBA_2024_advanced.html"
-    url_dict["shooting_2024"] = "https://www.basketball-reference.com/leagues/NBA_2024_shooting.html"
-    url_dict["per_game_2023"] = "https://www.basketball-reference.com/leagues/NBA_2023_per_game.html"
-    url_dict["per_100_poss_2023"] = "https://www.basketball-reference.com/leagues/NBA_2023_per_poss.html"
-    url_dict["advanced_2023"] = "https://www.basketball-reference.com/leagues/NBA_2023_advanced.html"
-    url_dict["shooting_2023"] = "https://www.basketball-reference.com/leagues/NBA_2023_shooting.html"
-    url_dict["per_game_2022"] = "https://www.basketball-reference.com/leagues/NBA_2022_per_game.html"
-    url_dict["per_100_poss_2022"] = "https://www.basketball-reference.com/leagues/NBA_2022_per_poss.html"
-    url_dict["advanced_2022"] = "https://www.basketball-reference.com/leagues/NBA_2022_advanced.html"
-    url_dict["shooting_2022"] = "https://www.basketball-reference.com/leagues/NBA_2022_shooting.html"
-    url_dict["per_game_2021"] = "https://www.basketball-reference.com/leagues/NBA_2021_per_game.html"
-    url_dict["per_100_poss_2021"] = "https://www.basketball-reference.com/leagues/NBA_2021_per_poss.html"
-    url_dict["advanced_2021"] = "https://www.basketball-reference.com/leagues/NBA_2021_advanced.html"
-    url_dict["shooting_2021"] = "https://www.basketball-reference.com/leagues/NBA_2021_shooting.html"
-    url_dict["per_game_2020"] = "https://www.basketball-reference.com/leagues/NBA_2020_per_game.html"
-    url_dict["per_100_poss_2020"] = "https://www.basketball-reference.com/leagues/NBA_2020_per_poss.html"
-    url_dict["advanced_2020"] = "https://www.basketball-reference.com/leagues/NBA_2020_advanced.html"
-    url_dict["shooting_2020"] = "https://www.basketball-reference.com/leagues/NBA_2020_shooting.html"
-    
-    for key, value in url_dict.items():
-        get_bref_stats(value, key)
-
-
-def process_and_merge_data(year: int):
-    """Process and merge all scraped data into a single dataframe for a given year"""
-    year = int(year)
-    file_map = {
-        "per_game": DATA_DIR / f"per_game_{year}.csv",
-        "per_100": DATA_DIR / f"per_100_poss_{year}.csv",
-        "advanced": DATA_DIR / f"advanced_{year}.csv",
-        "shooting": DATA_DIR / f"shooting_{year}.csv",
-    }
-    missing = [path for path in file_map.values() if not path.exists()]
-    if missing:
-        raise FileNotFoundError(f"Missing CSV files for year {year}: {', '.join(str(p) for p in missing)}")
-
-    # Load all CSV files
-    df_per_game = pd.read_csv(file_map["per_game"])
-    df_per_100_poss = pd.read_csv(file_map["per_100"])
-    df_advanced = pd.read_csv(file_map["advanced"])
-    df_shooting = pd.read_csv(file_map["shooting"], header=[0, 1])
-
-    # PICK THE COLUMNS I WANT + RENAMING THEM
-    per_game_sel = (
-        df_per_game
-            .loc[:, ["Player", "Age", "Team", "Pos", "G", "MP", "FG", "FGA", "FG%", "3P", "3PA", "3P%", "2P", "2PA", "2P%", "FT", "FTA", "FT%", "ORB", "DRB", "TRB", "AST", "STL", "BLK", "TOV", "PF", "PTS"]]
-            .rename(columns={
-                "Player": "player_name", 
-                "Age": "age", 
-                "Team": "team", 
-                "Pos": "position", 
-                "G": "games_played", 
-                "MP": "minutes_played_per_game", 
-                "FG": "field_goals_made_per_game", 
-                "FGA": "field_goal_attempts_per_game", 
-                "FG%": "field_goal_percentage", 
-                "3P": "three_pointers_made_per_game", 
-                "3PA": "three_point_attempts_per_game", 
-                "3P%": "three_point_percentage", 
-                "2P": "two_pointers_made_per_game", 
-                "2PA": "two_point_attempts_per_game", 
-                "2P%": "two_point_percentage", 
-                "FT": "free_throws_made_per_game", 
-                "FTA": "free_throw_attempts_per_game", 
-                "FT%": "free_throw_percentage", 
-                "ORB": "offensive_rebounds_per_game", 
-                "DRB": "defensive_rebounds_per_game", 
-                "TRB": "total_rebounds_per_game", 
-                "AST": "assists_per_game", 
-                "STL": "steals_per_game", 
-                "BLK": "blocks_per_game", 
-                "TOV": "turnovers_per_game", 
-                "PF": "personal_fouls_per_game", 
-                "PTS": "points_per_game"
-            })
-    )
+def save_bref_table(html_content: str, csv_name: str):
+    table = csv_name.rsplit("_", 1)[0] #"per_100_poss_2025" -> "per_100_poss"
+    df = parse_bref_table(html_content, STAT_TABLE_IDS.get(table)) #Finds the table whether visible or hidden inside an HTML comment
+    stat_store.write_table(df, csv_name) #Typed Arrow file for the merge, plus the CSV export
 
-    per_100_poss_sel = (
-        df_per_100_poss
-            .loc[:, ["Player", "Age", "Team", "ORtg", "DRtg"]]
-            .rename(columns={
-                "Player": "player_name", 
-                "Age": "age", 
-                "Team": "team", 
-                "ORtg": "offensive_rating", 
-                "DRtg": "defensive_rating"
-            })
-    )
 
-    advanced_sel = (
-        df_advanced
-            .loc[:, ["Player", "Age", "Team", "PER", "TS%", "TRB%", "AST%", "STL%", "BLK%", "TOV%", "USG%", "WS", "WS/48", "BPM", "VORP"]]
-            .rename(columns={
-                "Player": "player_name", 
-                "Age": "age", 
-                "Team": "team", 
-                "PER": "player_efficiency_rating", 
-                "TS%": "true_shooting_percentage", 
-                "TRB%": "total_rebound_percentage", 
-                "AST%": "assist_percentage", 
-                "STL%": "steal_percentage", 
-                "BLK%": "block_percentage", 
-                "TOV%": "turnover_percentage", 
-                "USG%": "usage_percentage", 
-                "WS": "win_shares", 
-                "WS/48": "win_shares_per_48", 
-                "BPM": "box_plus_minus", 
-                "VORP": "value_over_replacement_player"
-            })
-    )
+def get_bref_stats(url, csv_name): #Blocking single-page version, scrape_all_stats uses the async fetcher
+    html_content = httpx.get(url).text
+    save_bref_table(html_content, csv_name)
 
-    df_shooting_pct_FG_distance = df_shooting["% of FGA by Distance"]
-    df_shooting_FG_pct_distance = df_shooting["FG% by Distance"]
-    df_shooting_pct_assisted = df_shooting["% of FG Ast'd"]
-    df_shooting_corner_3 = df_shooting["Corner 3s"]
-
-    shooting_pct_FG_distance_sel = (
-        df_shooting_pct_FG_distance
-        .loc[:, ["2P", "0-3", "3-10", "10-16", "16-3P", "3P"]]
-        .rename(columns={
-            "2P": "two_point_attempt_percentage", 
-            "0-3": "layup_dunk_attempt_percentage", 
-            "3-10": "short_midrange_attempt_percentage", 
-            "10-16": "midrange_attempt_percentage", 
-            "16-3P": "long_midrange_attempt_percentage", 
-            "3P": "three_point_attempt_percentage"
-        })
-    )
 
-    shooting_FG_pct_distance_sel = (
-        df_shooting_FG_pct_distance
-        .loc[:, [ "0-3", "3-10", "10-16", "16-3P"]]
-        .rename(columns={
-            "0-3": "layup_dunk_made_percentage", 
-            "3-10": "short_midrange_made_percentage", 
-            "10-16": "midrange_made_percentage", 
-            "16-3P": "long_midrange_made_percentage"
-        })
-    )
+def build_url_dict(seasons: Optional[Iterable[int]] = None, tables: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """Build {csv_name: url} for any combination of seasons and stat tables"""
+    seasons = SEASONS if seasons is None else seasons
+    tables = STAT_PAGES.keys() if tables is None else tables
+    unknown = [t for t in tables if t not in STAT_PAGES]
+    if unknown:
+        raise ValueError(f"Unknown stat tables: {', '.join(unknown)}")
 
-    shooting_pct_assisted_sel = (
-        df_shooting_pct_assisted
-        .rename(columns={
-            "2P": "two_point_assisted_percentage", 
-            "3P": "three_point_assisted_percentage"
-        })
+    url_dict = {}
+    for season in seasons:
+        for table in tables:
+            url_dict[f"{table}_{int(season)}"] = f"{BREF_BASE_URL}/NBA_{int(season)}_{STAT_PAGES[table]}.html"
+    return url_dict
+
+
+async def scrape_all_stats(seasons: Optional[Iterable[int]] = None, tables: Optional[Iterable[str]] = None, concurrency: Optional[int] = None, force: bool = False):
+    """
+    Scrape basketball statistics from Basketball Reference for the given seasons and tables.
+    Sends conditional requests against the raw page snapshots and only re-parses pages that changed.
+    Returns {csv_name: "parsed" | "not_modified" | "unchanged"}.
+    """
+    url_dict = build_url_dict(seasons, tables)
+    headers = {} if force else {name: snapshots.conditional_headers(name) for name in url_dict}
+    fetcher = PageFetcher(
+        concurrency=concurrency or SCRAPE_CONCURRENCY,
+        min_interval=SCRAPE_MIN_INTERVAL,
+        max_retries=SCRAPE_MAX_RETRIES,
     )
 
-    shooting_corner_3_sel = (
-        df_shooting_corner_3
-        .rename(columns={
-            "%3PA": "corner_three_attempt_percentage", 
-            "3P%": "corner_three_made_percentage"
-        })
+    results = {}
+    failed = {}
+    async with fetcher:
+        async for name, response, error in fetcher.fetch_all(url_dict, headers):
+            if error is not None:
+                failed[name] = error
+                continue
+            csv_exists = (DATA_DIR / f"{name}.csv").exists()
+
+            if response.status_code == 304:
+                results[name] = "not_modified"
+                if not csv_exists: #Server says nothing changed but the CSV is gone, rebuild it offline
+                    await asyncio.to_thread(save_bref_table, snapshots.load_snapshot(name), name)
+                continue
+
+            changed = await asyncio.to_thread(snapshots.save_snapshot, name, url_dict[name], response.content, response.headers)
+            if not changed and csv_exists and not force:
+                results[name] = "unchanged" #Same bytes as last time, skip parsing
+                continue
+            await asyncio.to_thread(save_bref_table, response.text, name) #Parsing is CPU bound, keep it off the event loop
+            results[name] = "parsed"
+
+    if failed:
+        raise RuntimeError(f"Failed to scrape {', '.join(sorted(failed))}: {next(iter(failed.values()))}")
+    return dict(sorted(results.items()))
+
+
+def replay_snapshots(names: Optional[Iterable[str]] = None) -> List[str]:
+    """Rebuild the stat tables (Arrow + CSV) from the stored raw pages without touching the network"""
+    available = snapshots.list_snapshots()
+    names = available if names is None else list(names)
+    missing = [name for name in names if name not in available]
+    if missing:
+        raise FileNotFoundError(f"No snapshot for: {', '.join(missing)}")
+
+    for name in names:
+        save_bref_table(snapshots.load_snapshot(name), name)
+    return names
+
+
+def keep_tot_or_first_v1(df): #Legacy groupby().apply version, kept for parity checks and benchmarks
+    def pick_group(g):
+        has_multi = g["team"].isin(["2TM", "3TM", "4TM", "5TM", "6TM"]).any()
+        #Checks to see if any row in the group contains one of these markers in team column
+        #Returns a True/False series, .any() collapses it into a single True/False
+        if has_multi:
+            return g[g["team"].isin(["2TM", "3TM", "4TM", "5TM", "6TM"])].head(1)
+            #Filters g down to the row that only that matches 2TM or 3TM
+            #Takes only the top row, which is the combined stats
+
+        return g.head(1) #returns the top (no multi-team marker) if has_multi is False
+    out = (
+        df.sort_values(["player_name", "age", "team"]) #sorts each row in df by these three, ensures a consistent "top card"
+          .groupby("player_name", as_index=False, group_keys=False) 
+          #first arg: Break df down into groups by player_name, attach group label (player's name) as index (so names become index, not integers like 0,1, etc)
+          #as_index=False: keep player_name as a normal column instead of the index (Group labels stay as a column, not index)
+          #group_keys=False: prevents Pandas from reattaching the group label when combining the results (However, indexes might be screwed up: Luka's index might be 3 but the player after him is now 6 since his Mavs and Laker stats were 4 and 5 )
+          .apply(pick_group) 
+          #Runs pick_group(g) for each group (player). This collapses multiple rows into one.
+          .reset_index(drop=True)
+          #After .apply, the index can get messy. This resets to a simple 0..N-1 index.
+          #drop=True means “don’t keep the old index as a column”.
     )
     
-    df_shooting_player_age_team = pd.concat([df_shooting["Unnamed: 1_level_0"], df_shooting["Unnamed: 2_level_0"], df_shooting["Unnamed: 3_level_0"]], axis=1)
-
-    shooting_player_age_team_sel = (
-        df_shooting_player_age_team.
-        rename(columns={
-            "Player": "player_name", 
-            "Age": "age", 
-            "Team": "team"
-        })
+    return out
+
+
+def keep_tot_or_first(df: pd.DataFrame, keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    One row per player (per keys, ["player_name"] by default): the multi-team total row ("2TM", "3TM", ... any "NTM")
+    if the player has one, otherwise the first row by age then team.
+    Same output as keep_tot_or_first_v1 without a Python callback per group.
+    """
+    keys = keys or ["player_name"]
+    is_multi = df["team"].astype("string").str.fullmatch(MULTI_TEAM_PATTERN).fillna(False).astype(bool)
+    out = (
+        df.assign(_single_team=~is_multi)
+          .sort_values(keys + ["_single_team", "age", "team"]) #Multi-team rows sort to the top of each player
+          .dropna(subset=keys) #groupby used to drop rows without a name
+          .drop_duplicates(keys, keep="first")
+          .drop(columns="_single_team")
+          .reset_index(drop=True)
     )
+    return out
+
+
+def load_seasons(prefix: str, columns: Dict[str, str], years: List[int]) -> pd.DataFrame:
+    """One stat table for every requested season stacked into a single frame, with a year column"""
+    frames = []
+    for year in years:
+        df = stat_store.read_table(f"{prefix}_{year}", columns=list(columns)).rename(columns=columns)
+        df["year"] = float(year)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def process_and_merge_seasons(years: Optional[Iterable[int]] = None) -> pd.DataFrame:
+    """
+    Process and merge the scraped data for any range of seasons in one pass.
+    Each table is loaded for all seasons at once, then deduped and merged once with year in the keys,
+    so cost grows with total rows instead of rows x seasons x passes.
+    """
+    years = [int(y) for y in (SEASONS if years is None else years)]
+    tables = {
+        "per_game": PER_GAME_COLUMNS,
+        "per_100_poss": PER_100_POSS_COLUMNS,
+        "advanced": ADVANCED_COLUMNS,
+        "shooting": SHOOTING_COLUMNS,
+    }
+    missing = [f"{prefix}_{year}" for year in years for prefix in tables if not stat_store.table_exists(f"{prefix}_{year}")]
+    if missing:
+        raise FileNotFoundError(f"Missing stat tables: {', '.join(missing)}")
 
-    shooting_sel = pd.concat([shooting_player_age_team_sel, shooting_pct_FG_distance_sel, shooting_FG_pct_distance_sel, shooting_pct_assisted_sel, shooting_corner_3_sel], axis=1)
-
-    def keep_tot_or_first(df):
-        def pick_group(g):
-            has_multi = g["team"].isin(["2TM", "3TM", "4TM", "5TM", "6TM"]).any()
-            #Checks to see if any row in the group contains one of these markers in team column
-            #Returns a True/False series, .any() collapses it into a single True/False
-            if has_multi:
-                return g[g["team"].isin(["2TM", "3TM", "4TM", "5TM", "6TM"])].head(1)
-                #Filters g down to the row that only that matches 2TM or 3TM
-                #Takes only the top row, which is the combined stats
-
-            return g.head(1) #returns the top (no multi-team marker) if has_multi is False
-        out = (
-            df.sort_values(["player_name", "age", "team"]) #sorts each row in df by these three, ensures a consistent "top card"
-              .groupby("player_name", as_index=False, group_keys=False) 
-              #first arg: Break df down into groups by player_name, attach group label (player's name) as index (so names become index, not integers like 0,1, etc)
-              #as_index=False: keep player_name as a normal column instead of the index (Group labels stay as a column, not index)
-              #group_keys=False: prevents Pandas from reattaching the group label when combining the results (However, indexes might be screwed up: Luka's index might be 3 but the player after him is now 6 since his Mavs and Laker stats were 4 and 5 )
-              .apply(pick_group) 
-              #Runs pick_group(g) for each group (player). This collapses multiple rows into one.
-              .reset_index(drop=True)
-              #After .apply, the index can get messy. This resets to a simple 0..N-1 index.
-              #drop=True means “don’t keep the old index as a column”.
-        )
-        
-        return out
-
-    per_game_sel = keep_tot_or_first(per_game_sel)
-    per_100_poss_sel = keep_tot_or_first(per_100_poss_sel)
-    advanced_sel = keep_tot_or_first(advanced_sel)
-    shooting_sel = keep_tot_or_first(shooting_sel)
-
-    for df in (per_game_sel, per_100_poss_sel, advanced_sel, shooting_sel):
-        df.drop(columns="team", inplace=True)
+    # Load only the columns we keep from each table, already renamed
+    # Shooting comes out of the store with flat "group/stat" names, no more pulling the MultiIndex apart
+    per_game_sel, per_100_poss_sel, advanced_sel, shooting_sel = (
+        keep_tot_or_first(load_seasons(prefix, columns, years), keys=["year", "player_name"]).drop(columns="team")
+        for prefix, columns in tables.items()
+    )
 
-    merged = per_game_sel.merge(per_100_poss_sel, on=["player_name", "age"], how="inner", validate="one_to_one")
-    merged = merged.merge(advanced_sel, on=["player_name", "age"], how="inner", validate="one_to_one")
-    merged = merged.merge(shooting_sel, on=["player_name", "age"], how="inner", validate="one_to_one")
+    keys = ["year", "player_name", "age"]
+    merged = per_game_sel.merge(per_100_poss_sel, on=keys, how="inner", validate="one_to_one")
+    merged = merged.merge(advanced_sel, on=keys, how="inner", validate="one_to_one")
+    merged = merged.merge(shooting_sel, on=keys, how="inner", validate="one_to_one")
 
-    merged["year"] = float(year) #Overwrites a column 'year', setting each to float(year)
+    merged = merged[[c for c in merged.columns if c != "year"] + ["year"]] #Keep year as the last column like before
     merged['age'] = pd.to_numeric(merged['age'], errors='coerce') #errors='coerce' means to convert failures to NaN
     merged = merged[merged['player_name'].ne('League Average')]
     #merged[...] filters based on where the condition is true
     #.ne means not equal
     merged = merged.dropna(subset=['player_name', 'age', 'position'])
     #drops rows where at least one of these 3 are missing or NaN
-    return merged
+    return merged.reset_index(drop=True)
+
+
+def process_and_merge_data_v1(year: int): #Legacy per-season version, kept for parity checks and benchmarks
+    """Four loads, four dedups and three merges for a single season"""
+    per_game_sel, per_100_poss_sel, advanced_sel, shooting_sel = (
+        keep_tot_or_first(stat_store.read_table(f"{prefix}_{year}", columns=list(columns)).rename(columns=columns)).drop(columns="team")
+        for prefix, columns in (("per_game", PER_GAME_COLUMNS), ("per_100_poss", PER_100_POSS_COLUMNS),
+                                ("advanced", ADVANCED_COLUMNS), ("shooting", SHOOTING_COLUMNS))
+    )
+    merged = per_game_sel.merge(per_100_poss_sel, on=["player_name", "age"], how="inner", validate="one_to_one")
+    merged = merged.merge(advanced_sel, on=["player_name", "age"], how="inner", validate="one_to_one")
+    merged = merged.merge(shooting_sel, on=["player_name", "age"], how="inner", validate="one_to_one")
+    merged["year"] = float(year)
+    merged["age"] = pd.to_numeric(merged["age"], errors="coerce")
+    merged = merged[merged["player_name"].ne("League Average")]
+    return merged.dropna(subset=["player_name", "age", "position"])
+
+
+def process_and_merge_data(year: int):
+    """Process and merge all scraped data into a single dataframe for a given year"""
+    return process_and_merge_seasons([int(year)])
 
 #Old code, new code queries from DB
 def get_player_data(player_name: str, merged: pd.DataFrame) -> dict:
@@ -281,7 +336,7 @@ def get_player_data(player_name: str, merged: pd.DataFrame) -> dict:
     #df.set_index() to specify which column will be used as index
 
 
-async def create_player_models(merged: pd.DataFrame):
+async def create_player_models_v1(merged: pd.DataFrame): #Legacy row by row version, kept for parity checks and benchmarks
     player_models = []
     
     for index, row in merged.iterrows(): #.iterrows() loops row by row
@@ -302,29 +357,42 @@ async def create_player_models(merged: pd.DataFrame):
             player_models.append(player_model.model_dump()) #converts Player model to dict
         except Exception as e:
             print(f"Error creating model for {player_dict.get('player_name', 'Unknown')}: {e}")
-    
+
     return player_models
 
 
-def get_player_headshot(player_name: str) -> Optional[str]:
-    player_name = player_name.strip() if player_name else player_name
+def create_player_models(merged: pd.DataFrame, rejects: Optional[list] = None):
+    """
+    Batched conversion of the merged frame into Player dicts.
+    Derived columns and NaN -> None are computed on whole columns and every record is validated in one call.
+    Rows that fail validation are appended to rejects (player_name, year, errors) instead of being printed.
+    """
+    df = merged.copy()
+    df["year"] = df["year"].astype(float)
+    df["birth_year"] = df["year"] - pd.to_numeric(df["age"], errors="coerce") - 1
+    names = df["player_name"].dropna().unique()
+    df["headshot_url"] = df["player_name"].map({name: get_player_headshot(name) for name in names}) #One lookup per player, not per season
+    df = df.reindex(columns=PLAYER_FIELDS)
+
+    columns = [df[c].astype(object).where(df[c].notna(), None).tolist() for c in PLAYER_FIELDS] #NaN -> None a whole column at a time
+    records = [dict(zip(PLAYER_FIELDS, row)) for row in zip(*columns)]
     try:
-        matches = nba_players.find_players_by_full_name(player_name)
-        if not matches:
-            return None
-        player = matches[0]
-        url = nba_cdn_headshot(int(player["id"]))
-        return url
-    except Exception:
-        return None
-
-
-def nba_cdn_headshot(nba_player_id: int, size="1040x760") -> str:
-    return f"https://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/{size}/{nba_player_id}.png"
-
+        models = PLAYER_LIST.validate_python(records)
+    except ValidationError as e:
+        errors = {}
+        for err in e.errors():
+            errors.setdefault(err["loc"][0], []).append(f"{'.'.join(str(part) for part in err['loc'][1:])}: {err['msg']}")
+        if rejects is not None:
+            for index, messages in errors.items():
+                rejects.append({"player_name": records[index].get("player_name"), "year": records[index].get("year"), "errors": messages})
+        models = PLAYER_LIST.validate_python([r for i, r in enumerate(records) if i not in errors])
 
+    headshots.get_resolver().save() #Persist any names the regex fallback had to look up
+    return PLAYER_LIST.dump_python(models)
 
 
-
-        
-
+def get_player_headshot(player_name: str) -> Optional[str]:
+    try:
+        return headshots.get_resolver().resolve(player_name) #Hash lookup in the prebuilt name index, no scan of the player list
+    except Exception:
+        return None
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "snapshots")) #Lives next to data/, one .html.gz + .json per page
+
+
+def _paths(name: str):
+    return SNAPSHOT_DIR / f"{name}.html.gz", SNAPSHOT_DIR / f"{name}.json"
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def load_meta(name: str) -> Optional[dict]:
+    _, meta_path = _paths(name)
+    if not meta_path.exists():
+        return None
+    return json.loads(meta_path.read_text())
+
+
+def conditional_headers(name: str) -> dict:
+    """Validators from the last snapshot, so the server can answer 304 Not Modified"""
+    meta = load_meta(name)
+    if not meta or not _paths(name)[0].exists():
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def save_snapshot(name: str, url: str, content: bytes, headers) -> bool:
+    """
+    Stores the raw page compressed along with its ETag/Last-Modified and sha256.
+    Returns True if the content differs from the previous snapshot.
+    """
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    html_path, meta_path = _paths(name)
+    previous = load_meta(name)
+    digest = content_hash(content)
+    changed = previous is None or previous.get("sha256") != digest or not html_path.exists()
+
+    if changed:
+        tmp = html_path.with_suffix(".tmp")
+        tmp.write_bytes(gzip.compress(content))
+        tmp.replace(html_path) #Atomic swap so a crash never leaves a half written snapshot
+
+    meta = {
+        "url": url,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "sha256": digest,
+        "size": len(content),
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+    }
+    meta_path.write_text(json.dumps(meta, indent=2))
+    return changed
+
+
+def load_snapshot(name: str) -> Optional[str]:
+    html_path, _ = _paths(name)
+    if not html_path.exists():
+        return None
+    return gzip.decompress(html_path.read_bytes()).decode("utf-8")
+
+
+def list_snapshots() -> List[str]:
+    if not SNAPSHOT_DIR.exists():
+        return []
+    return sorted(p.name[: -len(".html.gz")] for p in SNAPSHOT_DIR.glob("*.html.gz"))
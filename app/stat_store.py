@@ -0,0 +1,79 @@
+"""
+Columnar on-disk store for the scraped stat tables.
+Each table is an uncompressed Arrow IPC (Feather v2) file in data/ so it can be memory-mapped
+and read column by column. The per-season CSVs are still written next to it for compatibility.
+Run from app/ to convert existing CSVs: python stat_store.py
+"""
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+DATA_DIR = Path("data")
+
+
+def _arrow_path(name: str) -> Path:
+    return DATA_DIR / f"{name}.arrow"
+
+
+def _csv_path(name: str) -> Path:
+    return DATA_DIR / f"{name}.csv"
+
+
+def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Flattens two-row headers: ("Unnamed: 1_level_0", "Player") -> "Player", ("Corner 3s", "3P%") -> "Corner 3s/3P%" """
+    if not isinstance(df.columns, pd.MultiIndex):
+        return df
+    flat = []
+    for top, bottom in df.columns:
+        flat.append(bottom if str(top).startswith("Unnamed:") else f"{top}/{bottom}")
+    out = df.copy()
+    out.columns = flat
+    return out
+
+
+def write_table(df: pd.DataFrame, name: str, export_csv: bool = True):
+    """Writes the typed Arrow file, plus the raw CSV export the rest of the tooling still reads"""
+    DATA_DIR.mkdir(exist_ok=True)
+    if export_csv:
+        df.to_csv(_csv_path(name), index=False)
+    table = pa.Table.from_pandas(clean_columns(df), preserve_index=False)
+    tmp = _arrow_path(name).with_suffix(".tmp")
+    feather.write_feather(table, tmp, compression="uncompressed") #Uncompressed so readers can memory-map it
+    tmp.replace(_arrow_path(name))
+
+
+def convert_csv(name: str):
+    """One-off migration of a CSV written by the old scraper"""
+    header = [0, 1] if name.startswith("shooting") else 0 #Shooting has the two-row header
+    write_table(pd.read_csv(_csv_path(name), header=header), name, export_csv=False)
+
+
+def read_table(name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Memory-maps the Arrow file and loads only the requested columns"""
+    path = _arrow_path(name)
+    if not path.exists() or (_csv_path(name).exists() and _csv_path(name).stat().st_mtime > path.stat().st_mtime):
+        if not _csv_path(name).exists():
+            raise FileNotFoundError(f"Missing stat table {name}: {path}")
+        convert_csv(name) #CSV only tree or hand edited CSV, (re)build the Arrow file once
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def table_exists(name: str) -> bool:
+    return _arrow_path(name).exists() or _csv_path(name).exists()
+
+
+def convert_all() -> List[str]:
+    names = sorted(p.stem for p in DATA_DIR.glob("*.csv"))
+    for name in names:
+        convert_csv(name)
+    return names
+
+
+if __name__ == "__main__":
+    if not DATA_DIR.exists() and Path("../data").exists():
+        DATA_DIR = Path("../data")
+    for converted in convert_all():
+        print(f"converted {converted}")
@@ -0,0 +1,139 @@
+from io import BytesIO, StringIO
+from typing import List, Optional
+
+import pandas as pd
+from bs4 import BeautifulSoup, Comment
+from lxml import etree
+
+
+def parse_bref_table_v1(html_content: str) -> pd.DataFrame: #Legacy path: full soup parse, comment re-parse, then read_html, kept for benchmarks
+    soup = BeautifulSoup(html_content, "lxml")
+
+    comment = soup.find(string=lambda text: isinstance(text, Comment) and "<table" in text)
+    if comment:
+        return pd.read_html(str(BeautifulSoup(comment, "lxml")))[0]
+    return pd.read_html(StringIO(html_content))[0]
+
+
+def _stream_tables(html_content: str, table_id: Optional[str]):
+    """
+    Single streaming pass over the page with lxml.
+    Returns (target, first_table, first_commented) where target is the table with table_id,
+    first_table the first visible table and first_commented the source of the first commented out table.
+    Stops as soon as the target table is closed and clears everything outside of tables as it goes.
+    """
+    first_table = None
+    first_commented = None
+    open_tables = 0
+
+    events = etree.iterparse(BytesIO(html_content.encode("utf-8")), events=("start", "end", "comment"), html=True, recover=True, encoding="utf-8")
+    for event, el in events:
+        if event == "comment":
+            text = el.text or ""
+            if "<table" not in text:
+                continue
+            if table_id and f'id="{table_id}"' in text:
+                found, _, _ = _stream_tables(text, table_id) #Basketball Reference hides most tables inside comments
+                if found is not None:
+                    return found, first_table, first_commented
+            if first_commented is None:
+                first_commented = text
+        elif event == "start":
+            if el.tag == "table":
+                open_tables += 1
+        else:
+            if el.tag == "table":
+                open_tables -= 1
+                if table_id and el.get("id") == table_id:
+                    return el, first_table, first_commented
+                if first_table is None:
+                    first_table = el
+                    continue
+            if open_tables == 0 and el is not first_table and first_table not in el.iterdescendants("table"):
+                el.clear(keep_tail=True) #Nothing we need below here, free it while streaming
+    return None, first_table, first_commented
+
+
+def find_bref_table(html_content: str, table_id: Optional[str] = None):
+    """
+    Finds the stats table by id whether it is visible or inside an HTML comment.
+    Falls back to the first commented out table, then the first visible table.
+    """
+    target, first_table, first_commented = _stream_tables(html_content, table_id)
+    if target is not None:
+        return target
+    if first_commented is not None:
+        target, first_in_comment, _ = _stream_tables(first_commented, None)
+        return target if target is not None else first_in_comment
+    return first_table
+
+
+_normalized_text = etree.XPath("normalize-space(string())")
+
+
+def _cell_text(cell) -> str:
+    if len(cell) == 0: #Most stat cells are a bare text node, skip the XPath call for those
+        text = cell.text
+        return " ".join(text.split()) if text else ""
+    return _normalized_text(cell)
+
+
+def _expand_row(tr) -> List[str]:
+    values = []
+    for cell in tr.iterchildren("th", "td"):
+        colspan = cell.get("colspan")
+        if colspan and colspan != "1":
+            values.extend([_cell_text(cell)] * int(colspan))
+        else:
+            values.append(_cell_text(cell))
+    return values
+
+
+def _header_columns(header_rows: List[List[str]]):
+    """Same column labels pd.read_html produces: flat for one header row, MultiIndex with Unnamed: N_level_L for blanks otherwise"""
+    if len(header_rows) == 1:
+        return header_rows[0]
+    width = max(len(row) for row in header_rows)
+    levels = []
+    for level, row in enumerate(header_rows):
+        row = row + [""] * (width - len(row))
+        levels.append([value or f"Unnamed: {i}_level_{level}" for i, value in enumerate(row)])
+    return pd.MultiIndex.from_arrays(levels)
+
+
+def _coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    for col in df.columns:
+        values = df[col].replace("", None)
+        converted = pd.to_numeric(values, errors="coerce")
+        if converted.notna().sum() == values.notna().sum(): #Only convert columns that are numeric all the way down
+            df[col] = converted
+        else:
+            df[col] = values
+    return df
+
+
+def table_to_dataframe(table) -> pd.DataFrame:
+    """Builds a DataFrame straight from an lxml <table>, skipping the repeated in-body header rows"""
+    header_rows = [_expand_row(tr) for tr in table.xpath("./thead/tr")]
+    body_rows = []
+    for tr in table.xpath("./tbody/tr | ./tr | ./tfoot/tr"):
+        if "thead" in (tr.get("class") or "").split():
+            continue
+        body_rows.append(_expand_row(tr))
+
+    if not header_rows and body_rows: #No <thead>, the first row is the header
+        header_rows = [body_rows.pop(0)]
+    if not header_rows:
+        raise ValueError("Table has no header")
+
+    columns = _header_columns(header_rows)
+    width = len(columns)
+    body_rows = [(row + [""] * width)[:width] for row in body_rows]
+    return _coerce_numeric(pd.DataFrame(body_rows, columns=columns))
+
+
+def parse_bref_table(html_content: str, table_id: Optional[str] = None) -> pd.DataFrame:
+    table = find_bref_table(html_content, table_id)
+    if table is None:
+        raise ValueError(f"No table found{f' with id {table_id}' if table_id else ''}")
+    return table_to_dataframe(table)
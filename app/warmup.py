@@ -0,0 +1,148 @@
+"""
+Pre-generates scouting reports so the first user to open a player doesn't wait for the model.
+Players come from the top N by minutes, every player in a season, or a file (one player id, or "name,birth_year", per line).
+Reports that are already cached and fresh are skipped; the rest are generated with bounded concurrency and
+under a requests-per-minute budget. Also runs in the background after POST /players when WARMUP_AFTER_INGEST_TOP is set.
+Run from app/: python warmup.py --top 50 [--season 2025] [--file players.txt] [--stub]
+"""
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+import cache
+import database
+import llm
+from fetcher import HostRateLimiter
+from reports import latest_report_key, load_seasons, report_cache_key, report_payload
+
+load_dotenv()
+
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4")) #Reports generating at once
+WARMUP_RPM = float(os.getenv("WARMUP_RPM", "10")) #LLM requests per minute, leaves room under the API quota for users
+WARMUP_AFTER_INGEST_TOP = int(os.getenv("WARMUP_AFTER_INGEST_TOP", "0")) #0 = don't warm after POST /players
+
+_background: Set[asyncio.Task] = set()
+
+
+async def _ids_from_file(db, path: Path) -> List[int]:
+    ids = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.isdigit():
+            ids.append(int(line))
+            continue
+        name, _, birth_year = line.rpartition(",")
+        player_id = (await db.execute(database.player_id_query(name.strip(), float(birth_year)))).scalar()
+        if player_id is None:
+            print(f"Skipping {line!r}: no such player")
+        else:
+            ids.append(player_id)
+    return ids
+
+
+async def select_players(top: Optional[int] = None, season: Optional[float] = None, file: Optional[Path] = None) -> List[int]:
+    """Player ids to warm, in priority order without duplicates: file first, then top N by minutes, then the whole season"""
+    ids = []
+    async with database.AsyncSessionLocal() as db:
+        if file is not None:
+            ids += await _ids_from_file(db, file)
+        if top:
+            ids += (await db.execute(database.top_minutes_query(top, season))).scalars().all()
+        elif season is not None:
+            ids += [row.player_id for row in await db.execute(database.roster_query(season=season))]
+    return list(dict.fromkeys(ids))
+
+
+async def warm(
+    player_ids: Iterable[int],
+    generate_report: Optional[Callable[[dict], Awaitable[str]]] = None,
+    concurrency: int = WARMUP_CONCURRENCY,
+    rpm: float = WARMUP_RPM,
+) -> dict:
+    """Generates every missing or stale report, returns counts per outcome"""
+    generate_report = generate_report or (lambda data: llm.generate_report(data, priority="background")) #Behind user requests
+    player_ids = list(player_ids)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    budget = HostRateLimiter(60 / rpm if rpm > 0 else 0)
+    counts = {"fresh": 0, "generated": 0, "coalesced": 0, "not found": 0, "failed": 0}
+    done = 0
+    t0 = time.perf_counter()
+
+    async def warm_one(player_id: int):
+        nonlocal done
+        name = f"player {player_id}"
+        async with semaphore:
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    rows = await load_seasons(db, player_id)
+                if not rows:
+                    status = "not found"
+                else:
+                    name = rows[0].player_name
+                    player_data = report_payload(rows)
+                    key = report_cache_key(player_data)
+                    cached = await cache.lookup(key)
+                    if cached is not None and cached[1]:
+                        status = "fresh"
+                    else:
+                        #Waits before taking the report lock, whose TTL only has to cover the generation itself
+                        await budget.wait("llm")
+                        _, source = await cache.get_or_generate(
+                            key, lambda: generate_report(player_data), alias=latest_report_key(player_id),
+                            fresher_than=time.time() - cache.REPORT_SOFT_TTL,
+                        )
+                        status = "generated" if source == "generated" else "coalesced" #Another worker or request beat us to it
+            except Exception as e:
+                print(f"Warming {name} failed: {e!r}")
+                status = "failed"
+        counts[status] += 1
+        done += 1
+        print(f"[{done}/{len(player_ids)}] {name}: {status} ({time.perf_counter() - t0:.1f}s)")
+
+    await asyncio.gather(*(warm_one(player_id) for player_id in player_ids))
+    return counts
+
+
+def start_in_background(top: int):
+    """Warms the top players by minutes without holding up the caller (POST /players)"""
+    async def run():
+        counts = await warm(await select_players(top=top))
+        print(f"Warm-up after ingest: {counts}")
+
+    task = asyncio.get_running_loop().create_task(run())
+    _background.add(task) #Keeps a reference until it finishes
+    task.add_done_callback(_background.discard)
+
+
+async def main(args):
+    try:
+        if args.stub:
+            llm.use("stub") #Cached under the stub's own keys, never served in place of real reports
+        player_ids = await select_players(args.top, args.season, args.file)
+        print(f"Warming {len(player_ids)} reports, {args.concurrency} at a time, at most {args.rpm:g} LLM requests per minute")
+        counts = await warm(player_ids, concurrency=args.concurrency, rpm=args.rpm)
+        print(counts)
+    finally:
+        await cache.close()
+        await database.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, help="top N players by minutes played")
+    parser.add_argument("--season", type=float, help="season year for --top (default: latest), or every player in it without --top")
+    parser.add_argument("--file", type=Path, help="one player id or 'name,birth_year' per line")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=WARMUP_RPM, help="LLM requests per minute (0 = unlimited)")
+    parser.add_argument("--stub", action="store_true", help="use the local stub model (LLM_PROVIDER=stub)")
+    args = parser.parse_args()
+    if not (args.top or args.season or args.file):
+        parser.error("pick players with --top, --season and/or --file")
+    asyncio.run(main(args))
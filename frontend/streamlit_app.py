@@ -249,18 +249,18 @@ def get_player_names():
         st.error(f"Connection error: {e}")
         return []
 
-def get_player_headshot(player_name, birth_year):
+def get_player_headshot(player_id):
     try:
-        response = requests.get(f"{BACKEND_URL}/player-headshot/{player_name}/{birth_year}")
+        response = requests.get(f"{BACKEND_URL}/players/{player_id}/headshot")
         if response.status_code == 200:
             return response.json().get("headshot_url")
         return None
     except:
         return None
 
-def generate_scout_report(player_name, birth_year):
+def generate_scout_report(player_id):
     try:
-        response = requests.get(f"{BACKEND_URL}/generate_report/{player_name}/{birth_year}")
+        response = requests.get(f"{BACKEND_URL}/players/{player_id}/report")
         if response.status_code == 200:
             return response.text
         else:
@@ -286,10 +286,10 @@ def display_player_image(headshot_url):
     else:
         st.write("🏀")  
 
-def create_combined_player_graph(player_name, birth_year):
+def create_combined_player_graph(player_id, player_name):
     """Create one combined matplotlib graph for player stats across years"""
     try:
-        response = requests.get(f"{BACKEND_URL}/player/{player_name}", params={"birth_year": birth_year})
+        response = requests.get(f"{BACKEND_URL}/players/{player_id}/seasons")
         if response.status_code != 200:
             return None
 
@@ -406,7 +406,7 @@ def main():
     
     player_options = [("No player selected", None)]
     for player in players:
-        if isinstance(player, dict) and "player_name" in player and "birth_year" in player:
+        if isinstance(player, dict) and "player_id" in player and "player_name" in player:
             display_name = f"{player['player_name']}"
             player_options.append((display_name, player))
     
@@ -424,7 +424,7 @@ def main():
         
         with headshot_col:
             if selected_player:
-                headshot_url = get_player_headshot(selected_player["player_name"], selected_player["birth_year"])
+                headshot_url = get_player_headshot(selected_player["player_id"])
                 display_player_image(headshot_url)
             else:
                 st.write("") 
@@ -439,7 +439,7 @@ def main():
                 if st.button("Generate Scout Report", type="primary", use_container_width=True):
                     with st.spinner("Generating scout report..."):
                         fig = create_combined_player_graph(
-                            selected_player["player_name"], selected_player["birth_year"]
+                            selected_player["player_id"], selected_player["player_name"]
                         )
                         if fig:
                             st.markdown('<h3 style="text-align: center; margin: 30px 0;">Player Performance Statistics</h3>', unsafe_allow_html=True)
@@ -448,10 +448,7 @@ def main():
                             st.markdown("<br><br>", unsafe_allow_html=True)
                         
                      
-                        report = generate_scout_report(
-                            selected_player["player_name"], 
-                            selected_player["birth_year"]
-                        )
+                        report = generate_scout_report(selected_player["player_id"])
                         
     
                         section_headers = ["Overview", "Strengths", "Weaknesses", "Playstyle and Tendencies", "Scheme Fit"]
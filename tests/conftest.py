@@ -0,0 +1,57 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR)) #The app's modules import each other flat, as when run from app/
+DATA_DIR = APP_DIR.parent / "data" #Bundled season CSVs
+
+#database builds its engines on import: point them at a scratch SQLite file, never at the database in .env
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'scout.db'}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+
+@pytest.fixture(scope="session")
+def bundled_tables(tmp_path_factory):
+    """Copy of the bundled season CSVs, so the Arrow files the stat store builds land in a temp dir rather than data/"""
+    tables = tmp_path_factory.mktemp("data")
+    for csv_path in DATA_DIR.glob("*.csv"):
+        shutil.copy(csv_path, tables / csv_path.name)
+    return tables
+
+
+@pytest.fixture
+def stat_tables(bundled_tables, monkeypatch):
+    """stat_store (and the scraper's merge on top of it) reads the bundled seasons"""
+    import stat_store
+
+    monkeypatch.setattr(stat_store, "DATA_DIR", bundled_tables)
+    return bundled_tables
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """cache (and everything built on it) talks to an in-process fakeredis server, one client per event loop"""
+    import fakeredis
+
+    import cache
+
+    server = fakeredis.FakeServer()
+    clients = {}
+
+    def get_client():
+        loop = asyncio.get_running_loop()
+        if loop not in clients:
+            clients[loop] = fakeredis.FakeAsyncRedis(server=server)
+        return clients[loop]
+
+    monkeypatch.setattr(cache, "REDIS_URL", "redis://fakeredis")
+    monkeypatch.setattr(cache, "get_client", get_client)
+    cache.clear_local()
+    yield server
+    cache.clear_local()
@@ -0,0 +1,63 @@
+import socket
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import cache
+import database
+import llm
+
+PLAYER = {"player_name": "Test Player", "birth_year": 1999.0, "year": 2025.0, "age": 25.0, "position": "PG", "points_per_game": 20.1}
+
+
+def _dead_redis_url() -> str:
+    """A local port nothing listens on"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"redis://127.0.0.1:{port}/0"
+
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    """main imported with REDIS_URL pointing at a Redis that isn't there, reports written by the stub model"""
+    url = _dead_redis_url()
+    monkeypatch.setenv("REDIS_URL", url)
+    monkeypatch.setattr(cache, "REDIS_URL", url)
+    monkeypatch.setattr(cache, "_client", None)
+    monkeypatch.setattr(llm, "_provider", None)
+    llm.use("stub", ttft=0, tokens=20)
+    cache.clear_local()
+    sys.modules.pop("main", None) #The rate limiter picks its storage when main is imported
+    import main
+
+    yield main
+    sys.modules.pop("main", None)
+    cache.clear_local()
+
+
+def _player_id(main) -> int:
+    main.ingest_players([PLAYER])
+    db = database.SessionLocal()
+    try:
+        return db.execute(database.player_id_query(PLAYER["player_name"], PLAYER["birth_year"])).scalar()
+    finally:
+        db.close()
+
+
+def test_report_is_served_with_redis_down(redis_down):
+    player_id = _player_id(redis_down)
+    with TestClient(redis_down.app) as client:
+        response = client.get(f"/players/{player_id}/report")
+        assert response.status_code == 200, response.text
+        assert response.headers["X-Report-Freshness"] == "fresh"
+        assert client.get(f"/players/{player_id}/report").text == response.text #From this worker's own cache tier
+    assert cache.stats()["redis"]["errors"] > 0 #The report cache read Redis as a miss
+
+
+def test_rate_limit_still_applies_with_redis_down(redis_down):
+    player_id = _player_id(redis_down)
+    with TestClient(redis_down.app) as client:
+        statuses = [client.get(f"/players/{player_id}/report").status_code for _ in range(11)]
+    assert statuses == [200] * 10 + [429] #Counted in memory until Redis is back
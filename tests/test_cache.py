@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+
+import cache
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache, "LOCK_POLL_INTERVAL", 0.01)
+
+
+class Generator:
+    """generate callback that counts its calls"""
+
+    def __init__(self, value="report", delay=0.05):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+def test_concurrent_misses_in_one_worker_generate_once():
+    generate = Generator()
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_generate("report:a", generate) for _ in range(25)))
+        return results, await cache.get("report:a")
+
+    results, cached = asyncio.run(main())
+    assert generate.calls == 1
+    assert Counter(source for _, source in results) == {"generated": 1, "coalesced": 24}
+    assert {value for value, _ in results} == {"report"}
+    assert cached == "report"
+
+
+def test_concurrent_misses_across_workers_generate_once():
+    generate = Generator()
+
+    async def main():
+        #_generate_once is the cross-worker half: each call stands for a different worker's leader
+        return await asyncio.gather(*(cache._generate_once("report:a", generate, 60, None, 0.0) for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert generate.calls == 1
+    assert sorted(generated for _, generated in results) == [False, False, False, True]
+    assert {value for value, _ in results} == {"report"}
+
+
+def test_lock_outlives_its_ttl_while_the_holder_generates(monkeypatch):
+    monkeypatch.setattr(cache, "LOCK_TTL_MS", 100)
+    generate = Generator(delay=0.5) #Five TTLs, like a request queued behind the LLM scheduler
+
+    async def main():
+        first = asyncio.ensure_future(cache._generate_once("report:a", generate, 60, None, 0.0))
+        await asyncio.sleep(0.05)
+        second = await cache._generate_once("report:a", generate, 60, None, 0.0)
+        return await first, second, await cache.get_client().exists("lock:report:a")
+
+    first, second, lock_left = asyncio.run(main())
+    assert generate.calls == 1
+    assert first == ("report", True) and second == ("report", False)
+    assert not lock_left
+
+
+def test_a_crashed_holders_lock_expires_and_a_waiter_takes_over(monkeypatch):
+    generate = Generator()
+
+    async def main():
+        await cache.get_client().set("lock:report:a", "crashed-worker", px=100) #Never refreshed or released
+        t0 = time.monotonic()
+        result = await cache.get_or_generate("report:a", generate)
+        return result, time.monotonic() - t0
+
+    (value, source), waited = asyncio.run(main())
+    assert (value, source) == ("report", "generated")
+    assert generate.calls == 1
+    assert waited >= 0.1
+
+
+def test_an_abandoned_generation_is_taken_over_by_a_waiter():
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise cache.GenerationAbandoned() #The first requester's client went away
+        return "report"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_generate("report:a", generate))
+        await asyncio.sleep(0.01)
+        waiter = await cache.get_or_generate("report:a", generate)
+        with pytest.raises(cache.GenerationAbandoned):
+            await leader
+        return waiter
+
+    assert asyncio.run(main()) == ("report", "generated")
+    assert len(calls) == 2
+
+
+def test_a_cancelled_holder_releases_its_lock():
+    generate = Generator(delay=10)
+
+    async def main():
+        holder = asyncio.ensure_future(cache.get_or_generate("report:a", generate))
+        await asyncio.sleep(0.05)
+        holder.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await holder
+        return await cache.get_client().exists("lock:report:a")
+
+    assert not asyncio.run(main())
+
+
+def test_failures_reach_every_waiter_and_nothing_is_cached():
+    async def generate():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("model error")
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_generate("report:a", generate) for _ in range(3)), return_exceptions=True)
+        return results, await cache.get("report:a"), await cache.get_client().exists("lock:report:a")
+
+    results, cached, lock_left = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cached is None and not lock_left
+
+
+def test_generates_without_a_lock_when_redis_is_down(monkeypatch):
+    monkeypatch.setattr(cache, "get_client", lambda: cache.aioredis.Redis(port=1, socket_connect_timeout=0.1)) #Nothing listens on port 1
+    generate = Generator()
+
+    value, source = asyncio.run(cache.get_or_generate("report:a", generate))
+    assert (value, source) == ("report", "generated")
+    assert generate.calls == 1
+
+
+def _counted(before: dict, after: dict) -> dict:
+    """Per-tier hit and miss counts between two stats() snapshots"""
+    return {tier: {name: after[tier][name] - before[tier][name] for name in ("hits", "misses")} for tier in ("local", "redis")}
+
+
+def test_alias_fallback_is_counted_as_one_lookup():
+    async def main():
+        await cache.set("report:old", "old report")
+        await cache.set("latest:1", "report:old")
+        cache.clear_local() #Both only in Redis now
+        before = cache.stats()
+        result = await cache.lookup("report:new", alias="latest:1")
+        return result, _counted(before, cache.stats())
+
+    result, counted = asyncio.run(main())
+    assert result == ("old report", False)
+    assert counted == {"local": {"hits": 0, "misses": 1}, "redis": {"hits": 1, "misses": 0}}
+
+
+def test_miss_then_generation_is_counted_as_one_lookup():
+    generate = Generator()
+
+    async def main():
+        before = cache.stats()
+        assert await cache.lookup("report:a", alias="latest:1") is None #Nothing under the alias either
+        await cache.get_or_generate("report:a", generate, alias="latest:1")
+        missed = _counted(before, cache.stats())
+        before = cache.stats()
+        assert await cache.lookup("report:a", alias="latest:1") == ("report", True)
+        return missed, _counted(before, cache.stats())
+
+    missed, hit = asyncio.run(main())
+    assert missed == {"local": {"hits": 0, "misses": 1}, "redis": {"hits": 0, "misses": 1}}
+    assert hit == {"local": {"hits": 1, "misses": 0}, "redis": {"hits": 0, "misses": 0}}
@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fetcher import PageFetcher
+
+
+def run_fetcher(handler, urls, **settings):
+    """{name: (status, body, error)} for every url, fetched through a mock transport"""
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        results = {}
+        async with PageFetcher(client=client, min_interval=0, backoff=0, **settings) as fetcher:
+            async for name, response, error in fetcher.fetch_all(urls):
+                results[name] = (response.status_code if response is not None else None, response.text if response is not None else None, error)
+        await client.aclose()
+        return results
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("concurrency", [1, 3, 8])
+def test_requests_in_flight_never_exceed_concurrency(concurrency):
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, text=request.url.path)
+
+    urls = {f"page_{i}": f"https://example.test/page_{i}" for i in range(12)}
+    results = run_fetcher(handler, urls, concurrency=concurrency)
+    assert peak == concurrency
+    assert {name: body for name, (_, body, _) in results.items()} == {f"page_{i}": f"/page_{i}" for i in range(12)}
+
+
+def test_retries_retryable_statuses_then_succeeds():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        return httpx.Response(503 if len(attempts) < 3 else 200, text="ok", headers={"Retry-After": "0"})
+
+    results = run_fetcher(handler, {"page": "https://example.test/page"}, max_retries=4)
+    assert results["page"][:2] == (200, "ok")
+    assert len(attempts) == 3
+
+
+def test_gives_up_after_max_retries():
+    attempts = []
+
+    def handler(request):
+        attempts.append(1)
+        return httpx.Response(429)
+
+    results = run_fetcher(handler, {"page": "https://example.test/page"}, max_retries=2)
+    assert isinstance(results["page"][2], httpx.HTTPStatusError)
+    assert len(attempts) == 3
+
+
+def test_client_errors_and_not_modified_are_not_retried():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        return httpx.Response(404 if request.url.path == "/missing" else 304)
+
+    results = run_fetcher(handler, {"missing": "https://example.test/missing", "same": "https://example.test/same"})
+    assert isinstance(results["missing"][2], httpx.HTTPStatusError)
+    assert results["same"][0] == 304 and results["same"][2] is None
+    assert sorted(attempts) == ["/missing", "/same"]
+
+
+def test_stopping_early_cancels_the_remaining_requests():
+    finished = []
+
+    async def handler(request):
+        if request.url.path != "/fast":
+            await asyncio.sleep(10)
+        finished.append(request.url.path)
+        return httpx.Response(200)
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with PageFetcher(client=client, concurrency=4, min_interval=0) as fetcher:
+            pages = fetcher.fetch_all({"fast": "https://example.test/fast", "slow": "https://example.test/slow"})
+            name, _, _ = await pages.__anext__()
+            await pages.aclose()
+        await asyncio.sleep(0)
+        await client.aclose()
+        return name
+
+    assert asyncio.run(asyncio.wait_for(main(), 5)) == "fast"
+    assert finished == ["/fast"]
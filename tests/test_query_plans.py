@@ -0,0 +1,35 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, select
+
+import database
+import migrations
+
+
+def test_every_lookup_uses_an_index_on_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    migrations.run_migrations(engine)
+    plans = migrations.check_query_plans(engine)
+    assert set(plans) == set(migrations.lookup_queries())
+    engine.dispose()
+
+
+def test_a_full_scan_is_caught(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    migrations.run_migrations(engine)
+    with engine.connect() as conn:
+        plan = migrations._plan(conn, select(database.Season).where(database.Season.points_per_game > 30)) #No index on it
+    assert migrations._is_full_scan("sqlite", plan)
+    engine.dispose()
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL to a scratch Postgres database")
+def test_every_lookup_uses_an_index_on_postgres():
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    if engine.dialect.name != "postgresql":
+        pytest.skip(f"TEST_DATABASE_URL is {engine.dialect.name}, not Postgres")
+    migrations.run_migrations(engine)
+    plans = migrations.check_query_plans(engine)
+    assert set(plans) == set(migrations.lookup_queries())
+    engine.dispose()
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import pytest
+
+import cache
+import scheduler
+from scheduler import Scheduler, SchedulerBusy
+
+
+@pytest.fixture
+def shared_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(scheduler, "POLL_INTERVAL", 0.01)
+    return fake_redis
+
+
+async def _queued():
+    """Lets every task reach the scheduler's queue before the test goes on"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_interactive_is_admitted_before_background_that_queued_first():
+    sched = Scheduler(max_in_flight=1, rpm=0, tpm=0, background_share=1.0, shared=False)
+    order = []
+
+    async def request(priority, name):
+        async with sched.slot(priority):
+            order.append(name)
+
+    async def main():
+        held = await sched.acquire("interactive")
+        tasks = [asyncio.create_task(request("background", "background 0")), asyncio.create_task(request("background", "background 1"))]
+        await _queued()
+        tasks += [asyncio.create_task(request("batch", "batch")), asyncio.create_task(request("interactive", "interactive"))]
+        await _queued()
+        await sched.release(held)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["interactive", "batch", "background 0", "background 1"]
+
+
+def test_lower_classes_only_get_their_share_of_in_flight():
+    sched = Scheduler(max_in_flight=4, rpm=0, tpm=0, background_share=0.5, background_queue_timeout=0.05, shared=False)
+
+    async def main():
+        leases = [await sched.acquire("background"), await sched.acquire("batch")]
+        with pytest.raises(SchedulerBusy):
+            await sched.acquire("background")
+        leases += [await sched.acquire("interactive"), await sched.acquire("interactive")] #The rest is kept for users
+        return leases
+
+    leases = asyncio.run(main())
+    assert sched.in_flight == len(leases) == 4
+
+
+def test_rpm_holds_requests_until_the_window_moves_on():
+    sched = Scheduler(max_in_flight=0, rpm=2, tpm=0, shared=False, window=0.2)
+
+    async def main():
+        t0 = time.monotonic()
+        waits = []
+        for _ in range(3):
+            await sched.acquire("interactive")
+            waits.append(time.monotonic() - t0)
+        return waits
+
+    waits = asyncio.run(main())
+    assert waits[1] < 0.1
+    assert waits[2] >= 0.15
+
+
+def test_tpm_holds_requests_but_lets_an_oversize_one_through_on_an_empty_window():
+    sched = Scheduler(max_in_flight=0, rpm=0, tpm=1000, shared=False, window=0.2, queue_timeout=0.05)
+
+    async def main():
+        await sched.acquire("interactive", tokens=5000) #Bigger than the whole budget, nothing else to wait for
+        with pytest.raises(SchedulerBusy):
+            await sched.acquire("interactive", tokens=100)
+        await asyncio.sleep(0.2)
+        await sched.acquire("interactive", tokens=600)
+        with pytest.raises(SchedulerBusy):
+            await sched.acquire("interactive", tokens=600)
+
+    asyncio.run(main())
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(Scheduler(shared=False).acquire("urgent"))
+
+
+def test_each_class_gives_up_after_its_own_queue_timeout():
+    sched = Scheduler(max_in_flight=1, rpm=0, tpm=0, background_share=1.0, queue_timeout=0.05, background_queue_timeout=0.3, shared=False)
+
+    async def main():
+        await sched.acquire("interactive")
+        waited = {}
+        for priority in ("interactive", "background"):
+            t0 = time.monotonic()
+            with pytest.raises(SchedulerBusy):
+                await sched.acquire(priority)
+            waited[priority] = time.monotonic() - t0
+        return waited
+
+    waited = asyncio.run(main())
+    assert 0.05 <= waited["interactive"] < 0.25
+    assert waited["background"] >= 0.3
+    stats = sched.stats()
+    assert stats["interactive"]["admitted"] == 1 and stats["interactive"]["timed_out"] == 1
+    assert stats["background"]["admitted"] == 0 and stats["background"]["timed_out"] == 1
+    assert stats["interactive"]["queued"] == stats["background"]["queued"] == 0
+
+
+def test_in_flight_is_shared_by_workers(shared_redis):
+    workers = [Scheduler(max_in_flight=1, rpm=0, tpm=0, queue_timeout=0.1, shared=True, namespace="t") for _ in range(2)]
+
+    async def main():
+        held = await workers[0].acquire("interactive")
+        with pytest.raises(SchedulerBusy):
+            await workers[1].acquire("interactive")
+        waiter = asyncio.create_task(workers[1].acquire("interactive"))
+        await asyncio.sleep(0.02)
+        await workers[0].release(held) #Not announced to the other worker, it finds out by polling
+        lease = await waiter
+        assert lease.shared
+        await workers[1].release(lease)
+        return await cache.get_client().zcard("t:in-flight")
+
+    assert asyncio.run(main()) == 0
+
+
+def test_per_minute_budgets_are_shared_by_workers(shared_redis):
+    #An hour-long period, so the test can't straddle two of them
+    workers = [Scheduler(max_in_flight=0, rpm=3, tpm=2500, queue_timeout=0.05, shared=True, namespace="t", window=3600) for _ in range(2)]
+
+    async def main():
+        await workers[0].acquire("interactive", tokens=1000)
+        await workers[1].acquire("interactive", tokens=1000)
+        with pytest.raises(SchedulerBusy): #Over tpm
+            await workers[0].acquire("interactive", tokens=1000)
+        await workers[1].acquire("interactive", tokens=100)
+        with pytest.raises(SchedulerBusy): #Over rpm
+            await workers[0].acquire("interactive", tokens=1)
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_no_lease_behind(shared_redis):
+    sched = Scheduler(max_in_flight=1, rpm=0, tpm=0, shared=True, namespace="t")
+
+    async def main():
+        held = await sched.acquire("interactive")
+        waiter = asyncio.create_task(sched.acquire("interactive"))
+        await asyncio.sleep(0.05) #Polling Redis meanwhile
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await sched.release(held)
+        await asyncio.sleep(0.05) #A lease won just as the waiter was cancelled is given back in the background
+        return await cache.get_client().zcard("t:in-flight")
+
+    assert asyncio.run(main()) == 0
+    assert sched.in_flight == 0
+    assert sched.stats()["interactive"]["queued"] == 0
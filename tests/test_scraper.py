@@ -0,0 +1,87 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+import scraper
+import stat_store
+
+TABLE_COLUMNS = {
+    "per_game": scraper.PER_GAME_COLUMNS,
+    "per_100_poss": scraper.PER_100_POSS_COLUMNS,
+    "advanced": scraper.ADVANCED_COLUMNS,
+    "shooting": scraper.SHOOTING_COLUMNS,
+}
+
+
+def _season_table(prefix: str, year: int) -> pd.DataFrame:
+    columns = TABLE_COLUMNS[prefix]
+    return stat_store.read_table(f"{prefix}_{year}", columns=list(columns)).rename(columns=columns)
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning") #groupby().apply on grouping columns, in the legacy version
+@pytest.mark.parametrize("prefix", TABLE_COLUMNS)
+def test_dedup_matches_the_groupby_version(stat_tables, prefix):
+    for year in scraper.SEASONS:
+        df = _season_table(prefix, year)
+        pd.testing.assert_frame_equal(scraper.keep_tot_or_first_v1(df), scraper.keep_tot_or_first(df))
+
+
+def test_dedup_prefers_any_multi_team_row():
+    traded = pd.DataFrame({"player_name": ["A", "A", "A", "B"], "age": [25, 25, 25, 30], "team": ["BOS", "7TM", "LAL", "NYK"]})
+    assert scraper.keep_tot_or_first(traded)["team"].tolist() == ["7TM", "NYK"] #The old version only knew 2TM to 6TM
+
+
+def test_dedup_keeps_one_row_per_key():
+    seasons = pd.DataFrame({
+        "year": [2024.0, 2024.0, 2025.0, 2025.0],
+        "player_name": ["A", "A", "A", "A"],
+        "age": [25, 25, 26, 26],
+        "team": ["BOS", "2TM", "LAL", "MIA"],
+    })
+    out = scraper.keep_tot_or_first(seasons, keys=["year", "player_name"])
+    assert out[["year", "team"]].values.tolist() == [[2024.0, "2TM"], [2025.0, "LAL"]]
+
+
+def test_batched_merge_matches_one_pass_per_season(stat_tables):
+    combined = scraper.process_and_merge_seasons(scraper.SEASONS)
+    per_season = pd.concat([scraper.process_and_merge_data_v1(year) for year in scraper.SEASONS], ignore_index=True)
+    key = ["year", "player_name", "age"]
+    assert not combined.duplicated(key).any()
+    pd.testing.assert_frame_equal(
+        combined.sort_values(key).reset_index(drop=True),
+        per_season.sort_values(key).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_merge_reports_missing_seasons(stat_tables):
+    with pytest.raises(FileNotFoundError, match="per_game_1999"):
+        scraper.process_and_merge_seasons([1999])
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """Headshot index built in memory from nba_api, nothing is written to data/"""
+    import headshots
+
+    monkeypatch.setattr(headshots, "_resolver", headshots.HeadshotResolver.build())
+
+
+def test_batched_conversion_matches_the_row_by_row_version(stat_tables, resolver):
+    merged = scraper.process_and_merge_seasons(scraper.SEASONS)
+    rejects = []
+    new = scraper.create_player_models(merged, rejects)
+    assert new == asyncio.run(scraper.create_player_models_v1(merged))
+    assert len(new) == len(merged) and rejects == []
+
+
+def test_invalid_rows_land_in_rejects(stat_tables, resolver):
+    bad = scraper.process_and_merge_seasons([scraper.SEASONS[0]]).head(3).copy()
+    bad.loc[bad.index[0], "position"] = None #position is required
+    rejects = []
+    converted = scraper.create_player_models(bad, rejects)
+    assert [p["player_name"] for p in converted] == bad["player_name"].tolist()[1:]
+    assert len(rejects) == 1
+    assert rejects[0]["player_name"] == bad["player_name"].iloc[0] and rejects[0]["year"] == float(scraper.SEASONS[0])
+    assert rejects[0]["errors"] == ["position: Input should be a valid string"]
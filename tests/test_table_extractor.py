@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from bench import bref_like_page
+from conftest import DATA_DIR
+from scraper import SEASONS, STAT_TABLE_IDS
+from table_extractor import parse_bref_table, parse_bref_table_v1
+
+TABLES = list(STAT_TABLE_IDS)
+
+
+def _old_parse(page: str) -> pd.DataFrame:
+    """The old path's frame, minus the repeated header rows it used to keep"""
+    old = parse_bref_table_v1(page)
+    old = old[old.iloc[:, 0].astype(str) != "Rk"].reset_index(drop=True)
+    return old.apply(lambda col: pd.to_numeric(col) if col.astype(str).str.fullmatch(r"-?[\d.]+|nan").all() else col)
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning") #read_html on literal html, in the legacy path
+@pytest.mark.parametrize("commented", [False, True], ids=["inline", "in-comment"])
+@pytest.mark.parametrize("table", TABLES)
+def test_extractor_matches_the_old_parse(table, commented):
+    page = bref_like_page(DATA_DIR / f"{table}_{SEASONS[0]}.csv", STAT_TABLE_IDS[table], commented, filler_links=50)
+    new = parse_bref_table(page, STAT_TABLE_IDS[table])
+    pd.testing.assert_frame_equal(_old_parse(page), new, check_dtype=False)
+    assert "Rk" not in new.iloc[:, 0].astype(str).tolist() #Repeated header rows are dropped